@@ -3,14 +3,46 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 """Wrappers for git operations."""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlparse
 
 import git
 
 from mbed_project.exceptions import VersionControlError
 from mbed_project._internal.progress import ProgressReporter
 
+logger = logging.getLogger(__name__)
+
+# Environment variable naming a directory in which mirrors of cloned repositories are kept. Repositories cloned while
+# it is set are cloned from the local mirror, which only needs to fetch the changes made since it was last updated.
+GIT_CACHE_DIR_ENV_VAR = "MBED_PROJECT_GIT_CACHE_DIR"
+
+# git configuration used when cloning a repository from a remote. A user's file system monitor or automatic gc would
+# only add work, or a background process, to a fresh clone.
+CLONE_CONFIG = {
+    "core.fsmonitor": "false",
+    "gc.auto": "0",
+}
+
+# Fetches every branch of the origin remote, whichever branches the clone is configured to track.
+_ALL_BRANCHES_REFSPEC = "+refs/heads/*:refs/remotes/origin/*"
+
+# A complete commit hash, as opposed to a branch, tag or abbreviated hash.
+_SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+
+# Serialises updates to each mirror, as libraries sharing a repository can be cloned from several threads.
+_mirror_locks: Dict[Path, threading.Lock] = {}
+_mirror_locks_lock = threading.Lock()
+
 
 @dataclass
 class GitReference:
@@ -24,19 +56,88 @@ class GitReference:
     repo_url: str
     ref: str
 
+    @property
+    def is_sha(self) -> bool:
+        """True if the reference is a complete commit hash, which always refers to the same revision."""
+        return bool(_SHA_RE.match(self.ref))
+
+
+def clone(
+    url: str,
+    dst_dir: Path,
+    progress: bool = True,
+    no_checkout: bool = False,
+    reference: Optional[Path] = None,
+    depth: Optional[int] = 1,
+    branch: Optional[str] = None,
+) -> git.Repo:
+    """Clone a repository.
 
-def clone(url: str, dst_dir: Path) -> git.Repo:
-    """Clone a library repository.
+    By default only the tip of the default branch is fetched, other references are fetched on demand by `checkout`.
+    Repositories on the local file system are cloned by hard linking their object database instead, which is faster
+    than transferring even a single revision. The origin remote of a clone from a file:// URL is set back to `url`.
+
+    If the environment variable named by `GIT_CACHE_DIR_ENV_VAR` is set, remote repositories are mirrored in that
+    directory and cloned locally from the mirror. The origin remote of the clone is set back to `url`.
+
+    Similarly, when `reference` is an existing clone of the same repository it is cloned locally and the origin remote
+    set back to `url`. If the local clone fails, the repository is cloned from `url` as normal.
 
     Args:
         url: URL of the remote to clone.
         dst_dir: Destination directory for the cloned repo.
+        progress: Display a progress bar for the clone operation.
+        no_checkout: Don't check out the default branch, for when a different revision is checked out afterwards.
+        reference: Path to an existing clone of the repository to copy the objects from.
+        depth: Number of commits of history to fetch from a remote, or `None` to fetch all branches and their history.
+        branch: Branch or tag to check out instead of the remote's default branch.
 
     Raises:
         VersionControlError: Cloning the repository failed.
     """
     try:
-        return git.Repo.clone_from(url, str(dst_dir), progress=ProgressReporter(name=url))
+        reporter = ProgressReporter(name=url) if progress else None
+        if reference is not None and not dst_dir.exists():
+            try:
+                repo = git.Repo.clone_from(
+                    str(reference), str(dst_dir), progress=reporter, local=True, no_checkout=no_checkout
+                )
+                repo.remotes.origin.set_url(url)
+                return repo
+            except git.exc.GitCommandError as err:
+                logger.info(f"Unable to copy '{url}' from the existing clone at {reference}, cloning it. {err.stderr}")
+                # Only remove what the failed copy left behind, the directory didn't exist before.
+                shutil.rmtree(dst_dir, ignore_errors=True)
+
+        local_path = _get_local_path(url)
+        if local_path is not None:
+            repo = git.Repo.clone_from(
+                local_path, str(dst_dir), progress=reporter, local=True, no_checkout=no_checkout, branch=branch
+            )
+            if local_path != url:
+                repo.remotes.origin.set_url(url)
+            return repo
+
+        cache_dir = os.environ.get(GIT_CACHE_DIR_ENV_VAR)
+        if cache_dir:
+            mirror = _update_mirror(url, Path(cache_dir), reporter)
+            repo = git.Repo.clone_from(
+                str(mirror), str(dst_dir), progress=reporter, local=True, no_checkout=no_checkout, branch=branch
+            )
+            repo.remotes.origin.set_url(url)
+            return repo
+
+        return git.Repo.clone_from(
+            url,
+            str(dst_dir),
+            progress=reporter,
+            env=_git_config_env(CLONE_CONFIG),
+            depth=depth,
+            no_tags=depth is not None,
+            single_branch=depth is not None,
+            no_checkout=no_checkout,
+            branch=branch,
+        )
     except git.exc.GitCommandError as err:
         raise VersionControlError(f"Cloning git repository from url '{url}' failed. Error from VCS: {err.stderr}")
 
@@ -44,21 +145,80 @@ def clone(url: str, dst_dir: Path) -> git.Repo:
 def checkout(repo: git.Repo, ref: str, force: bool = False) -> None:
     """Check out a specific reference in the given repository.
 
+    If the reference isn't known to the local repository it is fetched from the origin remote first.
+
     Args:
         repo: git.Repo object where the checkout will be performed.
-        ref: Git commit hash, branch or tag reference, must be a valid ref defined in the repo.
+        ref: Git commit hash, branch or tag reference.
+        force: Discard local changes when checking out.
 
     Raises:
         VersionControlError: Check out failed.
     """
-    git_object = git.repo.fun.name_to_object(repo, ref)
-    commit = git.repo.fun.to_commit(git_object)
     try:
-        repo.git.checkout(f"--force {commit}" if force else str(commit))
+        commit = _get_commit(repo, ref)
+    except ValueError:
+        fetched_ref = fetch(repo, ref)
+        try:
+            commit = _get_commit(repo, fetched_ref)
+        except ValueError:
+            raise VersionControlError(f"Revision '{ref}' was not found in the repository or its origin remote.")
+
+    try:
+        repo.git.checkout(commit, force=force)
     except git.exc.GitCommandError as err:
         raise VersionControlError(f"Failed to check out revision '{commit}'. Error from VCS: {err.stderr}")
 
 
+def fetch(repo: git.Repo, ref: str) -> str:
+    """Fetch a reference from the origin remote of the given repository.
+
+    Only the commit the reference points to is fetched. When the remote refuses to serve the reference directly, for
+    example an abbreviated commit hash, the complete history of every branch is fetched instead. Shallow clones only
+    track their default branch, so the branches are fetched with an explicit refspec.
+
+    Args:
+        repo: git.Repo object to fetch into.
+        ref: Git commit hash, branch or tag reference.
+
+    Returns:
+        A name that resolves to the fetched commit in the local repository.
+
+    Raises:
+        VersionControlError: Fetching the reference failed.
+    """
+    shallow = _is_shallow(repo)
+    try:
+        # Deepening a complete repository would truncate its history, only limit the depth of shallow clones.
+        repo.git.fetch("origin", ref, depth=1 if shallow else None)
+        return "FETCH_HEAD"
+    except git.exc.GitCommandError:
+        logger.info(f"Unable to fetch revision '{ref}' on its own, fetching the full repository history.")
+
+    try:
+        repo.git.fetch("origin", _ALL_BRANCHES_REFSPEC, tags=True, unshallow=shallow)
+    except git.exc.GitCommandError as err:
+        raise VersionControlError(f"Failed to fetch revision '{ref}'. Error from VCS: {err.stderr}")
+
+    return ref
+
+
+def is_detached_at(repo: git.Repo, commit: str) -> bool:
+    """Check if the repository's HEAD is detached at the given commit hash.
+
+    This reads HEAD from the repository's files rather than running git.
+
+    Args:
+        repo: git.Repo object to check.
+        commit: Complete commit hash.
+    """
+    try:
+        return bool(repo.head.is_detached and repo.head.commit.hexsha == commit)
+    except ValueError:
+        # HEAD doesn't point at a commit, e.g. a repository cloned without checking out a revision.
+        return False
+
+
 def init(path: Path) -> git.Repo:
     """Initialise a git repository at the given path.
 
@@ -95,3 +255,95 @@ def get_repo(path: Path) -> git.Repo:
         raise VersionControlError(
             "Could not find a valid git repository at this path. Please perform a `git init` command."
         )
+
+
+def _get_commit(repo: git.Repo, ref: str) -> str:
+    """Resolve a reference to a commit hash in the local repository.
+
+    The lookup goes through the `git cat-file --batch-check` process GitPython keeps running for the repository, so
+    resolving a reference doesn't spawn a new git process.
+
+    Raises:
+        ValueError: The reference doesn't resolve to a commit.
+    """
+    hexsha, _, _ = repo.git.get_object_header(f"{ref}^{{commit}}")
+    return str(hexsha.decode())
+
+
+def _update_mirror(url: str, cache_dir: Path, progress: Optional[ProgressReporter]) -> Path:
+    """Create or update the mirror of a remote repository in the cache directory.
+
+    Args:
+        url: URL of the remote repository.
+        cache_dir: Directory containing the repository mirrors.
+        progress: Progress reporter for the git operations.
+
+    Returns:
+        Path to the mirror.
+
+    Raises:
+        git.exc.GitCommandError: Creating the mirror failed.
+    """
+    mirror = cache_dir / hashlib.sha1(url.encode()).hexdigest()
+    with _mirror_locks_lock:
+        lock = _mirror_locks.setdefault(mirror, threading.Lock())
+
+    with lock:
+        if not mirror.exists():
+            logger.info(f"Creating mirror of '{url}' in the git cache.")
+            # Clone next to the final location and move it in place once complete, so an interrupted clone doesn't
+            # leave a broken mirror behind.
+            partial_mirror = mirror.with_suffix(".partial")
+            shutil.rmtree(partial_mirror, ignore_errors=True)
+            git.Repo.clone_from(
+                url, str(partial_mirror), progress=progress, env=_git_config_env(CLONE_CONFIG), mirror=True
+            )
+            partial_mirror.rename(mirror)
+            return mirror
+
+        logger.info(f"Updating mirror of '{url}' in the git cache.")
+        try:
+            git.Repo(str(mirror)).git.fetch("origin", prune=True)
+        except git.exc.GitCommandError as err:
+            logger.warning(f"Failed to update the cached mirror of '{url}', it may be out of date. {err.stderr}")
+
+    return mirror
+
+
+def _git_config_env(config: Dict[str, str]) -> Dict[str, str]:
+    """Get environment variables that set git configuration for a single git command.
+
+    GitPython refuses `-c` options for clones, git (2.31 and later) reads the same configuration from the environment.
+    Entries are added after any the user has already set in the environment, older versions of git ignore them.
+
+    Args:
+        config: Mapping of git configuration keys to values.
+    """
+    start = int(os.environ.get("GIT_CONFIG_COUNT", "0"))
+    env = {"GIT_CONFIG_COUNT": str(start + len(config))}
+    for index, (key, value) in enumerate(config.items(), start):
+        env[f"GIT_CONFIG_KEY_{index}"] = key
+        env[f"GIT_CONFIG_VALUE_{index}"] = value
+
+    return env
+
+
+def _get_local_path(url: str) -> Optional[str]:
+    """Get the file system path of a repository URL, or `None` if the repository isn't on the local file system.
+
+    git only uses its local clone optimisations for plain paths, so file:// URLs are converted to paths.
+    """
+    parsed_url = urlparse(url)
+    if parsed_url.scheme == "file":
+        # urllib.request pulls in http.client and email, so it's only imported when a file:// URL is cloned.
+        from urllib.request import url2pathname
+
+        path = url2pathname(parsed_url.path)
+    else:
+        path = url
+    return path if os.path.isdir(path) else None
+
+
+def _is_shallow(repo: git.Repo) -> bool:
+    """Check if the repository has truncated history."""
+    return Path(repo.git_dir, "shallow").exists()
@@ -4,15 +4,27 @@
 #
 """Objects for library reference handling."""
 import logging
+import os
 
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Generator, List
+from typing import Dict, Generator, Iterable, List, Optional, Set, Tuple
 
 from mbed_project._internal import git_utils
 
 logger = logging.getLogger(__name__)
 
+# Default number of library repositories cloned or checked out concurrently.
+DEFAULT_PARALLELISM = 8
+
+# .lib files only contain a URL, so this is enough to read them in a single call.
+LIB_FILE_READ_SIZE = 256
+
+# Directories which never contain library references: git metadata and build output, where a .lib file is a compiled
+# library rather than a reference.
+_PRUNED_DIR_NAMES = frozenset({".git", "BUILD"})
+
 
 @dataclass(frozen=True, order=True)
 class MbedLibReference:
@@ -32,7 +44,7 @@ class MbedLibReference:
 
     def is_resolved(self) -> bool:
         """Determines if the source code for this library is present in the source tree."""
-        return self.source_code_path.exists() and self.source_code_path.is_dir()
+        return self.source_code_path.is_dir()
 
     def get_git_reference(self) -> git_utils.GitReference:
         """Get the source code location from the library reference file.
@@ -40,39 +52,98 @@ class MbedLibReference:
         Returns:
             Data structure containing the contents of the library reference file.
         """
-        raw_ref = self.reference_file.read_text().strip()
+        with open(self.reference_file, "rb") as f:
+            contents = f.read(LIB_FILE_READ_SIZE)
+            if len(contents) == LIB_FILE_READ_SIZE:
+                contents += f.read()
+
+        raw_ref = contents.decode("utf-8").strip()
         url, sep, ref = raw_ref.partition("#")
         return git_utils.GitReference(repo_url=url, ref=ref)
 
 
 @dataclass
 class LibraryReferences:
-    """Manages library references in an MbedProgram."""
+    """Manages library references in an MbedProgram.
+
+    The references found in the program tree are cached, the cache is kept up to date when libraries are resolved and
+    rebuilt when they are checked out.
+    """
 
     root: Path
     ignore_paths: List[Path]
+    _references: Optional[List[MbedLibReference]] = field(default=None, init=False, repr=False, compare=False)
+
+    def resolve(self, parallelism: int = DEFAULT_PARALLELISM) -> None:
+        """Recursively clone all dependencies defined in .lib files.
+
+        Unresolved libraries found in the same pass are independent of each other, so they are cloned concurrently.
+        A library which pins a revision of a repository that has already been cloned is copied from that clone. A copy
+        starts at the revision of the clone it was copied from, so libraries without a pinned revision are always cloned
+        from the remote to get its default branch.
 
-    def resolve(self) -> None:
-        """Recursively clone all dependencies defined in .lib files."""
-        for lib in self.iter_unresolved():
-            git_ref = lib.get_git_reference()
-            logger.info(f"Resolving library reference {git_ref.repo_url}.")
-            repo = git_utils.clone(git_ref.repo_url, lib.source_code_path)
-            if git_ref.ref:
-                logger.info(f"Checking out revision {git_ref.ref} for library {git_ref.repo_url}.")
-                git_utils.checkout(repo, git_ref.ref)
-
-        # Check if we find any new references after cloning dependencies.
-        if list(self.iter_unresolved()):
-            self.resolve()
-
-    def checkout(self, force: bool) -> None:
-        """Check out all resolved libs to revision specified in .lib files."""
-        for lib in self.iter_resolved():
-            repo = git_utils.init(lib.source_code_path)
-            git_ref = lib.get_git_reference()
-            if git_ref.ref:
-                git_utils.checkout(repo, git_ref.ref, force=force)
+        Args:
+            parallelism: Maximum number of libraries to clone at the same time.
+        """
+        clones: Dict[str, Path] = {}
+        unresolved = list(self.iter_unresolved())
+        while unresolved:
+            remote_clones: List[Tuple[MbedLibReference, Optional[Path]]] = []
+            copies: List[Tuple[MbedLibReference, Optional[Path]]] = []
+            for lib in unresolved:
+                git_ref = lib.get_git_reference()
+                if git_ref.ref and git_ref.repo_url in clones:
+                    copies.append((lib, clones[git_ref.repo_url]))
+                else:
+                    clones.setdefault(git_ref.repo_url, lib.source_code_path)
+                    remote_clones.append((lib, None))
+
+            # The copies can only be made once the clones they are copied from exist.
+            _resolve_libraries(remote_clones, parallelism)
+            _resolve_libraries(copies, parallelism)
+
+            # New references can only appear in the source trees we just cloned, so there is no need to search the
+            # whole program tree again. References are found by a walk that prunes the ignored paths, so a library can
+            # only be ignored by being one of those paths, not by being inside one.
+            ignored = set(self.ignore_paths)
+            new_references = [
+                new_lib
+                for lib in unresolved
+                if lib.source_code_path not in ignored
+                for new_lib in self._iter_references(lib.source_code_path)
+            ]
+            self._get_references().extend(new_references)
+            resolved = _find_resolved(new_references)
+            unresolved = [lib for lib in new_references if lib.source_code_path not in resolved]
+
+    def checkout(self, force: bool, parallelism: int = DEFAULT_PARALLELISM) -> None:
+        """Check out all resolved libs to revision specified in .lib files.
+
+        The reference files of nested libraries belong to the revision of their parent library, so libraries are checked
+        out one level at a time. A level is only searched for references once the level above it has been checked out,
+        the libraries within a level are checked out concurrently.
+
+        Args:
+            force: Discard local changes in the libraries.
+            parallelism: Maximum number of libraries to check out at the same time.
+        """
+        # Different revisions of the libraries can contain different references.
+        self._references = None
+        ignored = set(self.ignore_paths)
+        references: List[MbedLibReference] = []
+        level = list(self._iter_references(self.root, include_nested=False))
+        while level:
+            references.extend(level)
+            resolved = list(_iter_by_resolution(level, resolved=True))
+            _checkout_libraries(resolved, force, parallelism)
+            level = [
+                nested_lib
+                for lib in resolved
+                if lib.source_code_path not in ignored
+                for nested_lib in self._iter_references(lib.source_code_path, include_nested=False)
+            ]
+
+        self._references = _sorted_parents_first(references)
 
     def iter_all(self) -> Generator[MbedLibReference, None, None]:
         """Iterate all library references in the tree.
@@ -80,9 +151,7 @@ class LibraryReferences:
         Yields:
             Iterator to library reference.
         """
-        for lib in self.root.rglob("*.lib"):
-            if not self._in_ignore_path(lib):
-                yield MbedLibReference(lib, lib.with_suffix(""))
+        yield from self._get_references()
 
     def iter_unresolved(self) -> Generator[MbedLibReference, None, None]:
         """Iterate all unresolved library references in the tree.
@@ -90,9 +159,7 @@ class LibraryReferences:
         Yields:
             Iterator to library reference.
         """
-        for lib in self.iter_all():
-            if not lib.is_resolved():
-                yield lib
+        yield from _iter_by_resolution(self._get_references(), resolved=False)
 
     def iter_resolved(self) -> Generator[MbedLibReference, None, None]:
         """Iterate all resolved library references in the tree.
@@ -100,10 +167,170 @@ class LibraryReferences:
         Yields:
             Iterator to library reference.
         """
-        for lib in self.iter_all():
-            if lib.is_resolved():
-                yield lib
+        yield from _iter_by_resolution(self._get_references(), resolved=True)
+
+    def _get_references(self) -> List[MbedLibReference]:
+        """Get the cached library references of the program tree, searching the tree if there are none."""
+        if self._references is None:
+            self._references = _sorted_parents_first(self._iter_references(self.root))
+
+        return self._references
+
+    def _iter_references(self, root: Path, include_nested: bool = True) -> Generator[MbedLibReference, None, None]:
+        """Iterate the library references found under the given directory.
+
+        Args:
+            root: Directory to search.
+            include_nested: Also search the source trees of the libraries found.
+        """
+        for lib in _walk_lib_files(root, prune=self.ignore_paths, include_nested=include_nested):
+            yield MbedLibReference(lib, lib.with_suffix(""))
+
+
+def _walk_lib_files(root: Path, prune: Iterable[Path], include_nested: bool = True) -> Generator[Path, None, None]:
+    """Find all .lib files in a directory tree.
+
+    The tree is walked with `os.scandir`, which gets the type of each entry from the directory listing instead of
+    calling `stat` on it. Directories in `prune`, and git metadata and build output directories, are skipped entirely
+    rather than being walked and filtered out. The walk itself works on path strings, a `Path` is only created for
+    each .lib file found.
+
+    Args:
+        root: Top of the directory tree to search.
+        prune: Directories that should not be searched.
+        include_nested: Search the source directories of the libraries found, which have the name of a .lib file.
+
+    Yields:
+        Paths to the .lib files in the tree.
+    """
+    # Paths are compared as strings, normalised so that e.g. "./mbed-os" from a walk of "." matches "mbed-os".
+    pruned = {os.path.normpath(path) for path in prune}
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirectories = []
+                lib_names = set()
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in _PRUNED_DIR_NAMES and os.path.normpath(entry.path) not in pruned:
+                            subdirectories.append(entry)
+                    elif entry.name.endswith(".lib"):
+                        lib_names.add(entry.name[: -len(".lib")])
+                        yield Path(entry.path)
+        except OSError as err:
+            logger.debug(f"Skipping directory {directory} while searching for .lib files: {err}")
+            continue
+
+        stack.extend(entry.path for entry in subdirectories if include_nested or entry.name not in lib_names)
+
+
+def _sorted_parents_first(libs: Iterable[MbedLibReference]) -> List[MbedLibReference]:
+    """Sort library references so that every library comes before the libraries nested in it.
+
+    Sorting by path alone is not enough, "P/nested.lib" sorts before "P.lib" because "P" < "P.lib".
+    """
+    return sorted(libs, key=lambda lib: (len(lib.reference_file.parts), lib.reference_file))
+
+
+def _find_resolved(libs: Iterable[MbedLibReference]) -> Set[Path]:
+    """Find the libraries whose source code is present in the source tree.
+
+    This is equivalent to calling `MbedLibReference.is_resolved` on each library, but the libraries usually share a
+    handful of parent directories, so each parent is listed once instead of probing every source code path.
+
+    Args:
+        libs: The library references to check.
+
+    Returns:
+        The source code paths of the resolved libraries.
+    """
+    return {lib.source_code_path for lib in _iter_by_resolution(libs, resolved=True)}
+
+
+def _iter_by_resolution(libs: Iterable[MbedLibReference], resolved: bool) -> Generator[MbedLibReference, None, None]:
+    """Iterate the libraries which are resolved, or unresolved, as found by listing their parent directories.
+
+    Parent directories are listed as the libraries are iterated, so stopping early avoids listing the remaining ones.
+
+    Args:
+        libs: The library references to check.
+        resolved: Whether to yield the resolved or the unresolved libraries.
+
+    Yields:
+        The library references with the requested resolution state.
+    """
+    subdirectories: Dict[Path, Set[str]] = {}
+    for lib in libs:
+        parent = lib.source_code_path.parent
+        if parent not in subdirectories:
+            subdirectories[parent] = _list_subdirectories(parent)
+        if (lib.source_code_path.name in subdirectories[parent]) == resolved:
+            yield lib
+
+
+def _list_subdirectories(directory: Path) -> Set[str]:
+    """Get the names of the directories in a directory, or an empty set if it can't be listed."""
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries if entry.is_dir()}
+    except OSError:
+        return set()
+
+
+def _resolve_libraries(libs: List[Tuple[MbedLibReference, Optional[Path]]], parallelism: int) -> None:
+    """Concurrently resolve libraries, each optionally copied from an existing clone of its repository."""
+    if not libs:
+        return
+
+    # tqdm can't draw several bars from different threads cleanly, only report progress for a single clone.
+    show_progress = len(libs) == 1
+    with ThreadPoolExecutor(max_workers=min(parallelism, len(libs))) as executor:
+        futures = [executor.submit(_resolve_library, lib, reference, show_progress) for lib, reference in libs]
+        for future in futures:
+            future.result()
+
+
+def _resolve_library(lib: MbedLibReference, reference: Optional[Path], show_progress: bool) -> None:
+    """Clone a library and check out the revision given in its reference file."""
+    git_ref = lib.get_git_reference()
+    logger.info(f"Resolving library reference {git_ref.repo_url}.")
+    # Checking out the default branch would be wasted work if a different revision is checked out afterwards.
+    repo = git_utils.clone(
+        git_ref.repo_url,
+        lib.source_code_path,
+        progress=show_progress,
+        no_checkout=bool(git_ref.ref),
+        reference=reference,
+    )
+    if git_ref.ref:
+        logger.info(f"Checking out revision {git_ref.ref} for library {git_ref.repo_url}.")
+        git_utils.checkout(repo, git_ref.ref)
+
+
+def _checkout_libraries(libs: List[MbedLibReference], force: bool, parallelism: int) -> None:
+    """Concurrently check out libraries to the revisions given in their reference files."""
+    if not libs:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(parallelism, len(libs))) as executor:
+        futures = [executor.submit(_checkout_library, lib, force) for lib in libs]
+        for future in futures:
+            future.result()
+
+
+def _checkout_library(lib: MbedLibReference, force: bool) -> None:
+    """Check out the revision given in a library's reference file, if there is one."""
+    git_ref = lib.get_git_reference()
+    if not git_ref.ref:
+        return
+
+    repo = git_utils.get_repo(lib.source_code_path)
+    # A commit hash always names the same revision, so there is nothing to do if it's already checked out. Checking it
+    # out again is only needed to discard local changes.
+    if git_ref.is_sha and not force and git_utils.is_detached_at(repo, git_ref.ref):
+        logger.debug(f"Library {lib.source_code_path} is already at revision {git_ref.ref}.")
+        return
 
-    def _in_ignore_path(self, lib_reference_path: Path) -> bool:
-        """Check if a library reference is in a path we want to ignore."""
-        return any(p in lib_reference_path.parents for p in self.ignore_paths)
+    git_utils.checkout(repo, git_ref.ref, force=force)
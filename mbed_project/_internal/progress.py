@@ -10,13 +10,18 @@ from typing import Optional, Any
 from git import RemoteProgress
 from tqdm import tqdm
 
+# git reports progress for every object it handles, so progress bars are redrawn at most every REDRAW_INTERVAL seconds
+# and at most MAX_REDRAWS times per operation.
+REDRAW_INTERVAL = 0.25
+MAX_REDRAWS = 200
+
 
 class ProgressBar(tqdm):
     """tqdm progress bar that can be used in a callback context."""
 
     total: Any
 
-    def update_progress(self, block_num: float = 1, block_size: float = 1, total_size: float = None) -> None:
+    def update_progress(self, block_num: float = 1, block_size: float = 1, total_size: Optional[float] = None) -> None:
         """Update the progress bar.
 
         Args:
@@ -26,7 +31,15 @@ class ProgressBar(tqdm):
         """
         if total_size is not None and self.total != total_size:
             self.total = total_size
-        self.update(block_num * block_size - self.n)
+
+        count = block_num * block_size
+        increment = count - self.n
+        finished = self.total is not None and count >= self.total
+        if increment <= 0 or (increment < self.miniters and not finished):
+            # Too small a change to be redrawn, it is included in the increment of a later update.
+            return
+
+        self.update(increment)
 
 
 class ProgressReporter(RemoteProgress):
@@ -51,10 +64,19 @@ class ProgressReporter(RemoteProgress):
             message: Message string describing the number of bytes transferred in the WRITING operation.
         """
         if self.BEGIN & op_code:
-            self.bar = ProgressBar(total=max_count, file=sys.stderr, leave=False)
+            # The progress line is "<operation>: <counts>", the bar displays the counts itself so only the operation
+            # name needs to be part of the description. It doesn't change until the next operation begins.
+            operation = self._cur_line.partition(":")[0]
+            self.bar = ProgressBar(
+                total=max_count,
+                desc=f"{self.name} {operation}",
+                file=sys.stderr,
+                leave=False,
+                mininterval=REDRAW_INTERVAL,
+                miniters=max(1, int((max_count or 1) / MAX_REDRAWS)),
+            )
 
-        self.bar.desc = f"{self.name} {self._cur_line}"
-        self.bar.update_progress(block_num=cur_count, total_size=max_count)
+        self.bar.update_progress(block_num=cur_count)
 
         if self.END & op_code:
             self.bar.close()
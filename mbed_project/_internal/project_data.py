@@ -5,15 +5,17 @@
 """Objects representing Mbed program and library data."""
 import json
 import logging
+import os
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Set
 
 logger = logging.getLogger(__name__)
 
 # mbed program file names and constants.
 TARGETS_JSON_FILE_PATH = Path("targets", "targets.json")
+_TARGETS_JSON_FILE_PATH_STR = os.fspath(TARGETS_JSON_FILE_PATH)
 MBED_OS_DIR_NAME = "mbed-os"
 MBED_OS_REFERENCE_URL = "https://github.com/ARMmbed/mbed-os"
 MBED_OS_REFERENCE_FILE_NAME = "mbed-os.lib"
@@ -62,36 +64,50 @@ class MbedProgramFiles:
         mbed_file = root_path / PROGRAM_ROOT_FILE_NAME
         mbed_os_ref = root_path / MBED_OS_REFERENCE_FILE_NAME
 
-        if mbed_file.exists() or mbed_os_ref.exists():
+        # Create the program files exclusively, an existing file means there is already a program at this path.
+        try:
+            mbed_file.open("x").close()
+        except FileExistsError:
+            raise ValueError(f"Program already exists at path {root_path}.")
+
+        try:
+            with mbed_os_ref.open("x") as f:
+                f.write(f"{MBED_OS_REFERENCE_URL}#master")
+        except FileExistsError:
+            mbed_file.unlink()
             raise ValueError(f"Program already exists at path {root_path}.")
 
-        mbed_file.touch()
         app_config.write_text(json.dumps(DEFAULT_APP_CONFIG, indent=4))
-        mbed_os_ref.write_text(f"{MBED_OS_REFERENCE_URL}#master")
         return cls(app_config_file=app_config, mbed_file=mbed_file, mbed_os_ref=mbed_os_ref)
 
     @classmethod
-    def from_existing(cls, root_path: Path) -> "MbedProgramFiles":
+    def from_existing(cls, root_path: Path, file_names: Optional[Set[str]] = None) -> "MbedProgramFiles":
         """Create MbedProgramFiles from a directory containing an existing program.
 
         Args:
             root_path: The path containing the MbedProgramFiles.
+            file_names: The names of the entries in `root_path`, if the caller has already listed it.
 
         Raises:
             ValueError: no MbedProgramFiles exists at this path.
         """
-        app_config: Optional[Path]
-        app_config = root_path / APP_CONFIG_FILE_NAME
-        if not app_config.exists():
+        # List the directory once rather than checking whether each of the program files exists.
+        if file_names is None:
+            file_names = list_file_names(root_path)
+
+        app_config: Optional[Path] = None
+        if APP_CONFIG_FILE_NAME in file_names:
+            app_config = root_path / APP_CONFIG_FILE_NAME
+        else:
             logger.info("This program does not contain an mbed_app.json config file.")
-            app_config = None
 
         mbed_os_file = root_path / MBED_OS_REFERENCE_FILE_NAME
-        if not mbed_os_file.exists():
+        if MBED_OS_REFERENCE_FILE_NAME not in file_names:
             raise ValueError("This path does not contain an mbed-os.lib, which is required for mbed programs.")
 
         mbed_file = root_path / PROGRAM_ROOT_FILE_NAME
-        mbed_file.touch(exist_ok=True)
+        if PROGRAM_ROOT_FILE_NAME not in file_names:
+            mbed_file.touch()
 
         return cls(app_config_file=app_config, mbed_file=mbed_file, mbed_os_ref=mbed_os_file)
 
@@ -111,19 +127,44 @@ class MbedOS:
     targets_json_file: Path
 
     @classmethod
-    def from_existing(cls, root_path: Path, check_root_path_exists: bool = True) -> "MbedOS":
-        """Create MbedOS from a directory containing an existing MbedOS installation."""
-        targets_json_file = root_path / TARGETS_JSON_FILE_PATH
+    def from_existing(
+        cls, root_path: Path, check_root_path_exists: bool = True, root_exists: Optional[bool] = None
+    ) -> "MbedOS":
+        """Create MbedOS from a directory containing an existing MbedOS installation.
 
-        if check_root_path_exists and not root_path.exists():
+        Args:
+            root_path: The root path of the MbedOS source tree.
+            check_root_path_exists: Raise an error if the root path doesn't exist.
+            root_exists: Whether the root path exists, if the caller already knows from listing its parent.
+
+        Raises:
+            ValueError: The root path doesn't exist and `check_root_path_exists` is set, or it is not a copy of MbedOS.
+        """
+        root = os.fspath(root_path)
+        if root_exists is None:
+            root_exists = os.path.exists(root)
+        if check_root_path_exists and not root_exists:
             raise ValueError("The mbed-os directory does not exist.")
 
-        if root_path.exists() and not targets_json_file.exists():
+        if root_exists and not os.path.exists(os.path.join(root, _TARGETS_JSON_FILE_PATH_STR)):
             raise ValueError("This MbedOS copy does not contain a targets.json file.")
 
+        targets_json_file = root_path / TARGETS_JSON_FILE_PATH
+
         return cls(root=root_path, targets_json_file=targets_json_file)
 
     @classmethod
     def from_new(cls, root_path: Path) -> "MbedOS":
         """Create MbedOS from an empty or new directory."""
         return cls(root=root_path, targets_json_file=root_path / TARGETS_JSON_FILE_PATH)
+
+
+def list_file_names(directory: Path) -> Set[str]:
+    """Get the names of the entries in a directory, or an empty set if it can't be listed.
+
+    Listing a directory once is cheaper than checking whether each of several files in it exists.
+    """
+    try:
+        return set(os.listdir(directory))
+    except OSError:
+        return set()
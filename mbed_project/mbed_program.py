@@ -4,9 +4,11 @@
 #
 """Mbed Program abstraction layer."""
 import logging
+import os
+import re
 
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Set
 from urllib.parse import urlparse
 
 from mbed_project.exceptions import ProgramNotFound, ExistingProgram, MbedOSNotFound
@@ -16,11 +18,15 @@ from mbed_project._internal.project_data import (
     MbedOS,
     PROGRAM_ROOT_FILE_NAME,
     MBED_OS_DIR_NAME,
+    list_file_names,
 )
-from mbed_project._internal.libraries import LibraryReferences, MbedLibReference
+from mbed_project._internal.libraries import DEFAULT_PARALLELISM, LibraryReferences, MbedLibReference
 
 logger = logging.getLogger(__name__)
 
+# A bare program name, which urlparse would return unchanged as the path of a URL without a host.
+_PROGRAM_NAME_RE = re.compile(r"^[\w.-]+$")
+
 
 class MbedProgram:
     """Represents an Mbed program.
@@ -32,26 +38,72 @@ class MbedProgram:
         * A collection of references to external libraries, defined in .lib files located in the program source tree
     """
 
-    def __init__(self, repo: git_utils.git.Repo, program_files: MbedProgramFiles, mbed_os: MbedOS) -> None:
+    __slots__ = ("_repo", "files", "_mbed_os", "lib_references")
+
+    def __init__(
+        self, repo: Optional[git_utils.git.Repo], program_files: MbedProgramFiles, mbed_os: Optional[MbedOS]
+    ) -> None:
         """Initialise the program attributes.
 
         Args:
-            repo: The program's git repository.
+            repo: The program's git repository, or `None` to open it from the program root when it is first used.
             program_files: Object holding paths to a set of files that define an Mbed program.
-            mbed_os: An instance of `MbedOS` holding paths to locations in the local copy of the Mbed OS source.
+            mbed_os: An instance of `MbedOS` holding paths to locations in the local copy of the Mbed OS source, or
+                     `None` to find the Mbed OS copy in the program root when it is first used.
         """
-        self.repo = repo
+        self._repo = repo
         self.files = program_files
-        self.mbed_os = mbed_os
-        self.lib_references = LibraryReferences(root=self.files.mbed_file.parent, ignore_paths=[self.mbed_os.root])
+        self._mbed_os = mbed_os
+        mbed_os_root = self.files.mbed_file.parent / MBED_OS_DIR_NAME if mbed_os is None else mbed_os.root
+        self.lib_references = LibraryReferences(root=self.files.mbed_file.parent, ignore_paths=[mbed_os_root])
+
+    @property
+    def repo(self) -> git_utils.git.Repo:
+        """The program's git repository.
+
+        Opening a repository reads its config and refs, so it is deferred until the repository is needed.
+
+        Raises:
+            VersionControlError: No valid git repository at the program root.
+        """
+        if self._repo is None:
+            self._repo = git_utils.get_repo(self.files.mbed_file.parent)
+        return self._repo
+
+    @property
+    def mbed_os(self) -> MbedOS:
+        """The program's copy of Mbed OS.
+
+        Commands working on the program's libraries don't need Mbed OS, so it is only looked for when it is used.
+
+        Raises:
+            MbedOSNotFound: The Mbed OS directory in the program root is not a valid copy of Mbed OS.
+        """
+        if self._mbed_os is None:
+            self._mbed_os = _find_mbed_os(self.files.mbed_file.parent, check_mbed_os=False)
+        return self._mbed_os
 
     @classmethod
-    def from_url(cls, url: str, dst_path: Path, check_mbed_os: bool = True) -> "MbedProgram":
+    def from_url(
+        cls,
+        url: str,
+        dst_path: Path,
+        check_mbed_os: bool = True,
+        depth: Optional[int] = 1,
+        branch: Optional[str] = None,
+    ) -> "MbedProgram":
         """Fetch an Mbed program from a remote URL.
 
+        By default only the latest revision of the program is cloned. This is all that is needed to work with the
+        program, the .lib files listed by `list_known_library_dependencies` are taken from the working tree.
+
         Args:
             url: URL of the remote program repository.
             dst_path: Destination path for the cloned program.
+            check_mbed_os: If True causes an exception to be raised if the Mbed OS source directory does not
+                           exist. If False, Mbed OS is only looked for when it is first used.
+            depth: Number of commits of history to clone, or `None` to clone the complete repository.
+            branch: Branch or tag of the program to clone instead of the default branch.
 
         Raises:
             ExistingProgram: `dst_path` already contains an Mbed program.
@@ -62,10 +114,12 @@ class MbedProgram:
                 "to an empty directory."
             )
         logger.info(f"Cloning Mbed program from URL '{url}'.")
-        repo = git_utils.clone(url, dst_path)
+        repo = git_utils.clone(url, dst_path, depth=depth, branch=branch)
 
+        # The same listing of the fresh clone is used to find the program files and the Mbed OS directory.
+        file_names = list_file_names(dst_path)
         try:
-            program_files = MbedProgramFiles.from_existing(dst_path)
+            program_files = MbedProgramFiles.from_existing(dst_path, file_names)
         except ValueError as e:
             raise ProgramNotFound(
                 f"This repository does not contain a valid Mbed program at the top level. {e} "
@@ -74,11 +128,7 @@ class MbedProgram:
                 "should cd to a directory containing a program before performing any other operations."
             )
 
-        try:
-            mbed_os = MbedOS.from_existing(dst_path / MBED_OS_DIR_NAME, check_mbed_os)
-        except ValueError as mbed_err:
-            raise MbedOSNotFound(f"{mbed_err}")
-
+        mbed_os = _find_mbed_os(dst_path, check_mbed_os=True, file_names=file_names) if check_mbed_os else None
         return cls(repo, program_files, mbed_os)
 
     @classmethod
@@ -114,44 +164,48 @@ class MbedProgram:
         Args:
             dir_path: Directory containing an Mbed program.
             check_mbed_os: If True causes an exception to be raised if the Mbed OS source directory does not
-                           exist.
+                           exist. If False, Mbed OS is only looked for when it is first used.
 
         Raises:
             ProgramNotFound: An existing program was not found in the path.
         """
         program_root = _find_program_root(dir_path)
         logger.info(f"Found existing Mbed program at path '{program_root}'")
+        # The same listing of the program root is used to find the program files and the Mbed OS directory.
+        file_names = list_file_names(program_root)
         try:
-            program = MbedProgramFiles.from_existing(program_root)
+            program = MbedProgramFiles.from_existing(program_root, file_names)
         except ValueError as program_files_err:
             raise ProgramNotFound(f"{dir_path} doesn't look like a path to a valid program. {program_files_err}")
 
-        repo = git_utils.get_repo(program_root)
-        try:
-            mbed_os = MbedOS.from_existing(program_root / MBED_OS_DIR_NAME, check_mbed_os)
-        except ValueError as mbed_os_err:
-            raise MbedOSNotFound(
-                f"Mbed OS was not found due to the following error: {mbed_os_err}"
-                "\nYou may need to resolve the mbed-os.lib reference. You can do this by performing a `checkout`."
-            )
+        mbed_os = _find_mbed_os(program_root, check_mbed_os=True, file_names=file_names) if check_mbed_os else None
+        return cls(None, program, mbed_os)
 
-        return cls(repo, program, mbed_os)
+    def resolve_libraries(self, parallelism: int = DEFAULT_PARALLELISM) -> None:
+        """Resolve all external dependencies defined in .lib files.
 
-    def resolve_libraries(self) -> None:
-        """Resolve all external dependencies defined in .lib files."""
-        self.lib_references.resolve()
+        Args:
+            parallelism: Maximum number of libraries to clone at the same time.
+        """
+        self.lib_references.resolve(parallelism)
 
-    def checkout_libraries(self, force: bool = False) -> None:
-        """Check out all resolved libraries to revisions specified in .lib files."""
-        self.lib_references.checkout(force)
+    def checkout_libraries(self, force: bool = False, parallelism: int = DEFAULT_PARALLELISM) -> None:
+        """Check out all resolved libraries to revisions specified in .lib files.
+
+        Args:
+            force: Discard local changes in the libraries.
+            parallelism: Maximum number of libraries to check out at the same time.
+        """
+        self.lib_references.checkout(force, parallelism)
 
     def list_known_library_dependencies(self) -> List[MbedLibReference]:
         """Returns a list of all known library dependencies."""
-        return [lib for lib in self.lib_references.iter_all()]
+        return list(self.lib_references.iter_all())
 
     def has_unresolved_libraries(self) -> bool:
         """Checks if any unresolved library dependencies exist in the program tree."""
-        return bool(list(self.lib_references.iter_unresolved()))
+        # Stop at the first unresolved library, there is no need to check the others.
+        return next(self.lib_references.iter_unresolved(), None) is not None
 
 
 def parse_url(name_or_url: str) -> Dict[str, str]:
@@ -163,6 +217,9 @@ def parse_url(name_or_url: str) -> Dict[str, str]:
     Returns:
         Dictionary containing the remote url and the destination path for the clone.
     """
+    if _PROGRAM_NAME_RE.match(name_or_url):
+        return {"url": f"https://github.com/armmbed/{name_or_url}", "dst_path": name_or_url}
+
     url_obj = urlparse(name_or_url)
     if url_obj.hostname:
         url = url_obj.geturl()
@@ -172,21 +229,38 @@ def parse_url(name_or_url: str) -> Dict[str, str]:
     return {"url": url, "dst_path": url_obj.path.rsplit("/", maxsplit=1)[-1].replace("/", "")}
 
 
-def _tree_contains_program(path: Path) -> bool:
+def _find_mbed_os(program_root: Path, check_mbed_os: bool, file_names: Optional[Set[str]] = None) -> MbedOS:
+    """Get the copy of Mbed OS in a program.
+
+    Args:
+        program_root: The root directory of the program.
+        check_mbed_os: If True causes an exception to be raised if the Mbed OS source directory does not exist.
+        file_names: The names of the entries in `program_root`, if the caller has already listed it.
+
+    Raises:
+        MbedOSNotFound: The Mbed OS directory is not a valid copy of Mbed OS.
+    """
+    root_exists = None if file_names is None else MBED_OS_DIR_NAME in file_names
+    try:
+        return MbedOS.from_existing(program_root / MBED_OS_DIR_NAME, check_mbed_os, root_exists=root_exists)
+    except ValueError as mbed_os_err:
+        raise MbedOSNotFound(
+            f"Mbed OS was not found due to the following error: {mbed_os_err}"
+            "\nYou may need to resolve the mbed-os.lib reference. You can do this by performing a `checkout`."
+        )
+
+
+def _tree_contains_program(path: Path) -> Optional[Path]:
     """Check if the current path or its ancestors contain a .mbed file.
 
     Args:
         path: The starting path for the search. The search walks up the tree from this path.
 
     Returns:
-        `True` if a .mbed file is located between `path` and filesystem root.
-        `False` if no .mbed file was found.
+        The path containing the .mbed file, if one is located between `path` and filesystem root.
+        `None` if no .mbed file was found.
     """
-    try:
-        _find_program_root(path)
-        return True
-    except ProgramNotFound:
-        return False
+    return _search_program_root(str(path.resolve()))
 
 
 def _find_program_root(cwd: Path) -> Path:
@@ -203,20 +277,39 @@ def _find_program_root(cwd: Path) -> Path:
     Returns:
         Path containing the .mbed file.
     """
-    potential_root = cwd.resolve()
-    while str(potential_root) != str(potential_root.anchor):
-        logger.debug(f"Searching for .mbed file at path {potential_root}")
-        root_file = potential_root / PROGRAM_ROOT_FILE_NAME
-        if root_file.exists() and root_file.is_file():
-            logger.debug(f".mbed file found at {potential_root}")
-            return potential_root
+    resolved_cwd = cwd.resolve()
+    program_root = _search_program_root(str(resolved_cwd))
+    if program_root is None:
+        raise ProgramNotFound(
+            f"No program found from {resolved_cwd} to {resolved_cwd.anchor}. Please set the cwd to a program "
+            "directory containing a .mbed file. You can also set your cwd to a program subdirectory if there is a "
+            ".mbed file at the root of your program's directory tree. If your program does not contain a .mbed file, "
+            "please create an empty .mbed file at the root of the program directory tree before performing any other "
+            "operations."
+        )
+
+    return program_root
+
+
+def _search_program_root(resolved_cwd: str) -> Optional[Path]:
+    """Search for the directory containing a .mbed file, from a resolved path up to the filesystem root.
+
+    Args:
+        resolved_cwd: The resolved directory path to start the search from.
+
+    Returns:
+        Path containing the .mbed file, or `None` if no .mbed file was found.
+    """
+    potential_root = resolved_cwd
+    # The anchor is reached when a path is its own parent.
+    parent = os.path.dirname(potential_root)
+    while parent != potential_root:
+        logger.debug("Searching for .mbed file at path %s", potential_root)
+        if os.path.isfile(os.path.join(potential_root, PROGRAM_ROOT_FILE_NAME)):
+            logger.debug(".mbed file found at %s", potential_root)
+            return Path(potential_root)
 
-        potential_root = potential_root.parent
+        potential_root, parent = parent, os.path.dirname(parent)
 
     logger.debug("No .mbed file found.")
-    raise ProgramNotFound(
-        f"No program found from {cwd.resolve()} to {cwd.resolve().anchor}. Please set the cwd to a program directory "
-        "containing a .mbed file. You can also set your cwd to a program subdirectory if there is a .mbed file at the "
-        "root of your program's directory tree. If your program does not contain a .mbed file, please create an empty "
-        ".mbed file at the root of the program directory tree before performing any other operations."
-    )
+    return None
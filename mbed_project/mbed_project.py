@@ -6,29 +6,40 @@
 import pathlib
 import logging
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from mbed_project.mbed_program import MbedProgram, parse_url
+from mbed_project._internal.libraries import DEFAULT_PARALLELISM
 
 logger = logging.getLogger(__name__)
 
 
-def clone_project(url: str, dst_path: Any = None, recursive: bool = False) -> None:
+def clone_project(
+    url: str,
+    dst_path: Any = None,
+    recursive: bool = False,
+    depth: Optional[int] = 1,
+    branch: Optional[str] = None,
+    parallelism: int = DEFAULT_PARALLELISM,
+) -> None:
     """Clones an Mbed project from a remote repository.
 
     Args:
         url: URL of the repository to clone.
         dst_path: Destination path for the repository.
         recursive: Recursively clone all project dependencies.
+        depth: Number of commits of the project's history to clone, or `None` to clone the complete repository.
+        branch: Branch or tag of the project to clone instead of the default branch.
+        parallelism: Maximum number of project dependencies to clone at the same time.
     """
     git_data = parse_url(url)
     url = git_data["url"]
     if not dst_path:
         dst_path = pathlib.Path(git_data["dst_path"])
 
-    program = MbedProgram.from_url(url, dst_path, check_mbed_os=False)
+    program = MbedProgram.from_url(url, dst_path, check_mbed_os=False, depth=depth, branch=branch)
     if recursive:
-        program.resolve_libraries()
+        program.resolve_libraries(parallelism)
 
 
 def initialise_project(path: pathlib.Path, create_only: bool) -> None:
@@ -43,7 +54,7 @@ def initialise_project(path: pathlib.Path, create_only: bool) -> None:
         program.resolve_libraries()
 
 
-def checkout_project_revision(path: pathlib.Path, force: bool = False) -> None:
+def checkout_project_revision(path: pathlib.Path, force: bool = False, parallelism: int = DEFAULT_PARALLELISM) -> None:
     """Checkout a specific revision of the current Mbed project.
 
     This function also resolves and syncs all library dependencies to the revision specified in the library reference
@@ -54,12 +65,13 @@ def checkout_project_revision(path: pathlib.Path, force: bool = False) -> None:
         project_revision: Revision of the Mbed project to check out.
         force: Force overwrite uncommitted changes. If False, the checkout will fail if there are uncommitted local
                changes.
+        parallelism: Maximum number of library dependencies to check out or clone at the same time.
     """
     program = MbedProgram.from_existing(path, check_mbed_os=False)
-    program.checkout_libraries(force=force)
+    program.checkout_libraries(force=force, parallelism=parallelism)
     if program.has_unresolved_libraries():
         logger.info("Unresolved libraries detected, downloading library source code.")
-        program.resolve_libraries()
+        program.resolve_libraries(parallelism)
 
 
 def get_known_libs(path: pathlib.Path) -> Dict[str, Any]:
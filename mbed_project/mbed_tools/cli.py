@@ -6,12 +6,13 @@
 import os
 import pathlib
 
-from typing import Any
+from typing import Any, Optional
 
 import click
 import tabulate
 
 from mbed_project import initialise_project, clone_project, get_known_libs, checkout_project_revision
+from mbed_project._internal.libraries import DEFAULT_PARALLELISM
 
 
 @click.command()
@@ -39,7 +40,22 @@ def init(path: str, create_only: bool) -> None:
     show_default=True,
     help="Skip resolving program library dependencies after cloning.",
 )
-def clone(url: str, path: Any, skip_resolve_libs: bool) -> None:
+@click.option("--branch", "-b", help="Branch or tag of the program to clone instead of the default branch.")
+@click.option(
+    "--full-history",
+    is_flag=True,
+    show_default=True,
+    help="Clone the complete history of the program instead of only the latest revision.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=DEFAULT_PARALLELISM,
+    show_default=True,
+    help="Number of library dependencies to clone at the same time.",
+)
+def clone(url: str, path: Any, skip_resolve_libs: bool, branch: Optional[str], full_history: bool, jobs: int) -> None:
     """Clone an Mbed project and library dependencies.
 
     URL: The git url of the remote project to clone.
@@ -54,7 +70,7 @@ def clone(url: str, path: Any, skip_resolve_libs: bool) -> None:
         click.echo(f"Destination path is '{path}'")
         path = pathlib.Path(path)
 
-    clone_project(url, path, not skip_resolve_libs)
+    clone_project(url, path, not skip_resolve_libs, depth=None if full_history else 1, branch=branch, parallelism=jobs)
 
 
 @click.command()
@@ -68,7 +84,8 @@ def libs(path: str) -> None:
     click.echo("This program has the following library dependencies: \n")
     table = []
     for lib in sorted(lib_data["known_libs"]):
-        table.append([lib.reference_file.stem, lib.get_git_reference().repo_url, lib.get_git_reference().ref])
+        git_ref = lib.get_git_reference()
+        table.append([lib.reference_file.stem, git_ref.repo_url, git_ref.ref])
 
     headers = ("Library Name", "Repository URL", "Git reference")
     click.echo(tabulate.tabulate(table, headers=headers))
@@ -84,7 +101,15 @@ def libs(path: str) -> None:
 @click.option(
     "--force", "-f", is_flag=True, show_default=True, help="Force checkout, overwrites local uncommitted changes."
 )
-def checkout(path: str, force: bool) -> None:
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=DEFAULT_PARALLELISM,
+    show_default=True,
+    help="Number of library dependencies to check out or clone at the same time.",
+)
+def checkout(path: str, force: bool, jobs: int) -> None:
     """Checks out Mbed program library dependencies at the revision specified in the ".lib" files.
 
     Ensures all dependencies are resolved and the versions are synchronised to the version specified in the library
@@ -95,4 +120,4 @@ def checkout(path: str, force: bool) -> None:
     REVISION: The revision of the Mbed project to check out.
     """
     click.echo("Checking out all libraries to revisions specified in .lib files. Resolving any unresolved libraries.")
-    checkout_project_revision(pathlib.Path(path), force)
+    checkout_project_revision(pathlib.Path(path), force, jobs)
@@ -0,0 +1 @@
+Add the MBED_PROJECT_GIT_CACHE_DIR environment variable, which keeps mirrors of cloned repositories in the given directory and clones from them.
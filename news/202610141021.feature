@@ -0,0 +1 @@
+Add --branch and --full-history options to the clone command, programs are cloned without history by default.
@@ -0,0 +1 @@
+Add `--jobs` option to the `clone` and `checkout` commands to set how many libraries are processed at the same time.
@@ -3,6 +3,7 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import TestCase, mock
 
 from mbed_project.exceptions import VersionControlError
@@ -10,31 +11,339 @@ from mbed_project._internal import git_utils
 
 
 class TestClone(TestCase):
-    @mock.patch("mbed_project._internal.git_utils.git.Repo", autospec=True)
+    @mock.patch("mbed_project._internal.git_utils.git.Repo.clone_from", autospec=True)
     @mock.patch("mbed_project._internal.git_utils.ProgressReporter", autospec=True)
-    def test_returns_repo(self, mock_progress, mock_repo):
+    def test_returns_repo(self, mock_progress, mock_clone_from):
         url = "https://blah"
         path = Path()
         repo = git_utils.clone(url, path)
 
         self.assertIsNotNone(repo)
-        mock_repo.clone_from.assert_called_once_with(url, str(path), progress=mock_progress())
+        mock_clone_from.assert_called_once_with(
+            url,
+            str(path),
+            progress=mock_progress(),
+            env=mock.ANY,
+            depth=1,
+            no_tags=True,
+            single_branch=True,
+            no_checkout=False,
+            branch=None,
+        )
+
+    @mock.patch("mbed_project._internal.git_utils.git.Repo.clone_from", autospec=True)
+    @mock.patch("mbed_project._internal.git_utils.ProgressReporter", autospec=True)
+    def test_does_not_report_progress_if_disabled(self, mock_progress, mock_clone_from):
+        url = "https://blah"
+        path = Path()
+        git_utils.clone(url, path, progress=False)
+
+        mock_progress.assert_not_called()
+        mock_clone_from.assert_called_once_with(
+            url,
+            str(path),
+            progress=None,
+            env=mock.ANY,
+            depth=1,
+            no_tags=True,
+            single_branch=True,
+            no_checkout=False,
+            branch=None,
+        )
+
+    @mock.patch("mbed_project._internal.git_utils.git.Repo.clone_from", autospec=True)
+    @mock.patch("mbed_project._internal.git_utils.ProgressReporter", autospec=True)
+    def test_clones_local_repo_with_hardlinks(self, mock_progress, mock_clone_from):
+        path = Path()
+        with TemporaryDirectory() as local_repo:
+            git_utils.clone(Path(local_repo).as_uri(), path)
+
+            mock_clone_from.assert_called_once_with(
+                local_repo, str(path), progress=mock_progress(), local=True, no_checkout=False, branch=None
+            )
+            mock_clone_from.return_value.remotes.origin.set_url.assert_called_once_with(Path(local_repo).as_uri())
+
+    @mock.patch.dict("os.environ", {git_utils.GIT_CACHE_DIR_ENV_VAR: "cache"})
+    @mock.patch("mbed_project._internal.git_utils._update_mirror", autospec=True)
+    @mock.patch("mbed_project._internal.git_utils.git.Repo.clone_from", autospec=True)
+    @mock.patch("mbed_project._internal.git_utils.ProgressReporter", autospec=True)
+    def test_clones_from_cached_mirror_if_cache_dir_set(self, mock_progress, mock_clone_from, mock_update_mirror):
+        url = "https://blah"
+        path = Path()
+        mock_update_mirror.return_value = Path("cache", "mirror")
+
+        repo = git_utils.clone(url, path)
+
+        mock_update_mirror.assert_called_once_with(url, Path("cache"), mock_progress())
+        mock_clone_from.assert_called_once_with(
+            str(mock_update_mirror.return_value),
+            str(path),
+            progress=mock_progress(),
+            local=True,
+            no_checkout=False,
+            branch=None,
+        )
+        repo.remotes.origin.set_url.assert_called_once_with(url)
+
+    @mock.patch("mbed_project._internal.git_utils.git.Repo.clone_from", autospec=True)
+    def test_can_skip_checkout_of_default_branch(self, mock_clone_from):
+        url = "https://blah"
+        path = Path()
+        git_utils.clone(url, path, progress=False, no_checkout=True)
+
+        mock_clone_from.assert_called_once_with(
+            url,
+            str(path),
+            progress=None,
+            env=mock.ANY,
+            depth=1,
+            no_tags=True,
+            single_branch=True,
+            no_checkout=True,
+            branch=None,
+        )
+
+    @mock.patch("mbed_project._internal.git_utils.git.Repo.clone_from", autospec=True)
+    def test_copies_existing_clone_if_reference_given(self, mock_clone_from):
+        url = "https://blah"
+        path = Path("does-not-exist")
+        reference = Path("existing")
+
+        repo = git_utils.clone(url, path, progress=False, reference=reference)
+
+        mock_clone_from.assert_called_once_with(str(reference), str(path), progress=None, local=True, no_checkout=False)
+        repo.remotes.origin.set_url.assert_called_once_with(url)
+
+    @mock.patch("mbed_project._internal.git_utils.git.Repo.clone_from", autospec=True)
+    def test_clones_from_url_if_copying_reference_fails(self, mock_clone_from):
+        url = "https://blah"
+        mock_clone_from.side_effect = [git_utils.git.exc.GitCommandError("git clone", 255), mock.DEFAULT]
+
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, "dst")
+            git_utils.clone(url, path, progress=False, reference=Path("existing"))
+
+        mock_clone_from.assert_called_with(
+            url,
+            str(path),
+            progress=None,
+            env=mock.ANY,
+            depth=1,
+            no_tags=True,
+            single_branch=True,
+            no_checkout=False,
+            branch=None,
+        )
+
+    @mock.patch("mbed_project._internal.git_utils.git.Repo.clone_from", autospec=True)
+    def test_clones_full_history_of_branch_if_requested(self, mock_clone_from):
+        url = "https://blah"
+        path = Path()
+        git_utils.clone(url, path, progress=False, depth=None, branch="feature")
+
+        mock_clone_from.assert_called_once_with(
+            url,
+            str(path),
+            progress=None,
+            env=mock.ANY,
+            depth=None,
+            no_tags=False,
+            single_branch=False,
+            no_checkout=False,
+            branch="feature",
+        )
 
     def test_raises_when_clone_fails(self):
         with self.assertRaises(VersionControlError):
             git_utils.clone("", Path())
 
 
-@mock.patch("mbed_project._internal.git_utils.git.Repo", autospec=True)
+@mock.patch("mbed_project._internal.git_utils._get_commit", autospec=True)
+class TestCheckout(TestCase):
+    def test_checks_out_commit_the_ref_resolves_to(self, mock_get_commit):
+        repo = mock.Mock()
+        mock_get_commit.return_value = "abc123"
+
+        git_utils.checkout(repo, "master", force=True)
+
+        repo.git.fetch.assert_not_called()
+        repo.git.checkout.assert_called_once_with("abc123", force=True)
+
+    @mock.patch("mbed_project._internal.git_utils._is_shallow", autospec=True, return_value=True)
+    def test_fetches_ref_if_not_found_locally(self, mock_is_shallow, mock_get_commit):
+        repo = mock.Mock()
+        mock_get_commit.side_effect = [ValueError, "abc123"]
+
+        git_utils.checkout(repo, "feature-branch")
+
+        repo.git.fetch.assert_called_once_with("origin", "feature-branch", depth=1)
+        mock_get_commit.assert_called_with(repo, "FETCH_HEAD")
+        repo.git.checkout.assert_called_once_with("abc123", force=False)
+
+    @mock.patch("mbed_project._internal.git_utils.fetch", autospec=True, return_value="abc123")
+    def test_raises_when_ref_not_found_after_fetch(self, mock_fetch, mock_get_commit):
+        repo = mock.Mock()
+        mock_get_commit.side_effect = ValueError
+
+        with self.assertRaises(VersionControlError):
+            git_utils.checkout(repo, "abc123")
+
+        repo.git.checkout.assert_not_called()
+
+    def test_raises_when_checkout_fails(self, mock_get_commit):
+        repo = mock.Mock()
+        repo.git.checkout.side_effect = git_utils.git.exc.GitCommandError("git checkout", 255)
+
+        with self.assertRaises(VersionControlError):
+            git_utils.checkout(repo, "master")
+
+
+class TestGitReference(TestCase):
+    def test_complete_commit_hash_is_sha(self):
+        self.assertTrue(git_utils.GitReference(repo_url="https://blah", ref="0123456789abcdef" * 2 + "01234567").is_sha)
+
+    def test_branches_tags_and_abbreviated_hashes_are_not_shas(self):
+        for ref in ("master", "mbed-os-6.0.0", "0123abc", ""):
+            self.assertFalse(git_utils.GitReference(repo_url="https://blah", ref=ref).is_sha)
+
+
+class TestIsDetachedAt(TestCase):
+    def test_true_if_head_detached_at_commit(self):
+        repo = mock.Mock()
+        repo.head.is_detached = True
+        repo.head.commit.hexsha = "abc"
+
+        self.assertTrue(git_utils.is_detached_at(repo, "abc"))
+
+    def test_false_if_head_is_a_branch(self):
+        repo = mock.Mock()
+        repo.head.is_detached = False
+        repo.head.commit.hexsha = "abc"
+
+        self.assertFalse(git_utils.is_detached_at(repo, "abc"))
+
+    def test_false_if_head_has_no_commit(self):
+        repo = mock.Mock()
+        repo.head.is_detached = True
+        type(repo.head).commit = mock.PropertyMock(side_effect=ValueError)
+
+        self.assertFalse(git_utils.is_detached_at(repo, "abc"))
+
+
+class TestUpdateMirror(TestCase):
+    @mock.patch("mbed_project._internal.git_utils.git.Repo.clone_from", autospec=True)
+    def test_creates_mirror_if_not_cached(self, mock_clone_from):
+        url = "https://blah"
+        mock_clone_from.side_effect = lambda url, path, **kwargs: Path(path).mkdir()
+        with TemporaryDirectory() as cache_dir:
+            mirror = git_utils._update_mirror(url, Path(cache_dir), None)
+
+            self.assertTrue(mirror.is_dir())
+            self.assertEqual(mirror.parent, Path(cache_dir))
+            mock_clone_from.assert_called_once_with(url, mock.ANY, progress=None, env=mock.ANY, mirror=True)
+
+    @mock.patch("mbed_project._internal.git_utils.git.Repo", autospec=True)
+    def test_updates_existing_mirror(self, mock_repo):
+        url = "https://blah"
+        with TemporaryDirectory() as cache_dir:
+            mock_repo.clone_from.side_effect = lambda url, path, **kwargs: Path(path).mkdir()
+            mirror = git_utils._update_mirror(url, Path(cache_dir), None)
+
+            self.assertEqual(git_utils._update_mirror(url, Path(cache_dir), None), mirror)
+            mock_repo.clone_from.assert_called_once()
+            mock_repo.assert_called_once_with(str(mirror))
+            mock_repo.return_value.git.fetch.assert_called_once_with("origin", prune=True)
+
+
+class TestGitConfigEnv(TestCase):
+    @mock.patch.dict("os.environ", clear=True)
+    def test_sets_config_through_environment(self):
+        env = git_utils._git_config_env({"core.fsmonitor": "false", "gc.auto": "0"})
+
+        self.assertEqual(
+            env,
+            {
+                "GIT_CONFIG_COUNT": "2",
+                "GIT_CONFIG_KEY_0": "core.fsmonitor",
+                "GIT_CONFIG_VALUE_0": "false",
+                "GIT_CONFIG_KEY_1": "gc.auto",
+                "GIT_CONFIG_VALUE_1": "0",
+            },
+        )
+
+    @mock.patch.dict("os.environ", {"GIT_CONFIG_COUNT": "1"})
+    def test_keeps_config_set_in_environment(self):
+        env = git_utils._git_config_env({"core.fsmonitor": "false"})
+
+        self.assertEqual(
+            env, {"GIT_CONFIG_COUNT": "2", "GIT_CONFIG_KEY_1": "core.fsmonitor", "GIT_CONFIG_VALUE_1": "false"}
+        )
+
+
+class TestGetLocalPath(TestCase):
+    def test_returns_path_of_local_directory(self):
+        with TemporaryDirectory() as local_repo:
+            self.assertEqual(git_utils._get_local_path(local_repo), local_repo)
+            self.assertEqual(git_utils._get_local_path(Path(local_repo).as_uri()), local_repo)
+
+    def test_returns_none_for_remote_url(self):
+        self.assertIsNone(git_utils._get_local_path("https://github.com/ARMmbed/mbed-os"))
+
+
+class TestGetCommit(TestCase):
+    def test_resolves_ref_with_persistent_cat_file_process(self):
+        repo = mock.Mock()
+        repo.git.get_object_header.return_value = (b"abc123", b"commit", 230)
+
+        self.assertEqual(git_utils._get_commit(repo, "v1.0"), "abc123")
+        repo.git.get_object_header.assert_called_once_with("v1.0^{commit}")
+
+
+class TestFetch(TestCase):
+    @mock.patch("mbed_project._internal.git_utils._is_shallow", autospec=True, return_value=True)
+    def test_fetches_single_ref(self, mock_is_shallow):
+        repo = mock.Mock()
+
+        self.assertEqual(git_utils.fetch(repo, "abc123"), "FETCH_HEAD")
+        repo.git.fetch.assert_called_once_with("origin", "abc123", depth=1)
+
+    @mock.patch("mbed_project._internal.git_utils._is_shallow", autospec=True, return_value=False)
+    def test_does_not_limit_depth_of_complete_repo(self, mock_is_shallow):
+        repo = mock.Mock()
+
+        git_utils.fetch(repo, "abc123")
+
+        repo.git.fetch.assert_called_once_with("origin", "abc123", depth=None)
+
+    @mock.patch("mbed_project._internal.git_utils._is_shallow", autospec=True)
+    def test_fetches_full_history_if_ref_cannot_be_fetched_directly(self, mock_is_shallow):
+        repo = mock.Mock()
+        repo.git.fetch.side_effect = [git_utils.git.exc.GitCommandError("git fetch", 128), None]
+
+        self.assertEqual(git_utils.fetch(repo, "abc123"), "abc123")
+        repo.git.fetch.assert_called_with(
+            "origin", "+refs/heads/*:refs/remotes/origin/*", tags=True, unshallow=mock_is_shallow.return_value
+        )
+
+    @mock.patch("mbed_project._internal.git_utils._is_shallow", autospec=True)
+    def test_raises_when_fetch_fails(self, mock_is_shallow):
+        repo = mock.Mock()
+        repo.git.fetch.side_effect = git_utils.git.exc.GitCommandError("git fetch", 128)
+
+        with self.assertRaises(VersionControlError):
+            git_utils.fetch(repo, "abc123")
+
+
+@mock.patch("mbed_project._internal.git_utils.git.Repo.init", autospec=True)
 class TestInit(TestCase):
-    def test_returns_initialised_repo(self, mock_repo):
+    def test_returns_initialised_repo(self, mock_init):
         repo = git_utils.init(Path())
 
         self.assertIsNotNone(repo)
-        mock_repo.init.assert_called_once_with(str(Path()))
+        mock_init.assert_called_once_with(str(Path()))
 
-    def test_raises_when_init_fails(self, mock_repo):
-        mock_repo.init.side_effect = git_utils.git.exc.GitCommandError("git init", 255)
+    def test_raises_when_init_fails(self, mock_init):
+        mock_init.side_effect = git_utils.git.exc.GitCommandError("git init", 255)
 
         with self.assertRaises(VersionControlError):
             git_utils.init(Path())
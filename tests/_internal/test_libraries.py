@@ -2,10 +2,13 @@
 # Copyright (C) 2020 Arm Mbed. All rights reserved.
 # SPDX-License-Identifier: Apache-2.0
 #
+import os
 import pathlib
 
 from unittest import TestCase, mock
 
+import git
+
 from mbed_project._internal.libraries import MbedLibReference, LibraryReferences
 from tests.factories import make_mbed_lib_reference, patchfs
 
@@ -16,14 +19,92 @@ class TestLibraryReferences(TestCase):
     def test_hydrates_top_level_library_references(self, mock_clone, fs):
         fs_root = pathlib.Path(fs, "foo")
         lib = make_mbed_lib_reference(fs_root, ref_url="https://git")
-        mock_clone.side_effect = lambda url, dst_dir: dst_dir.mkdir()
+        mock_clone.side_effect = lambda url, dst_dir, **kwargs: dst_dir.mkdir()
 
         lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
         lib_refs.resolve()
 
-        mock_clone.assert_called_once_with(lib.get_git_reference().repo_url, lib.source_code_path)
+        mock_clone.assert_called_once_with(
+            lib.get_git_reference().repo_url, lib.source_code_path, progress=True, no_checkout=False, reference=None
+        )
         self.assertTrue(lib.is_resolved())
 
+    @patchfs
+    def test_hydrates_multiple_library_references_without_progress_bars(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        lib = make_mbed_lib_reference(fs_root, ref_url="https://git")
+        lib2 = make_mbed_lib_reference(fs_root, name="otherlib.lib", ref_url="https://git2")
+        mock_clone.side_effect = lambda url, dst_dir, **kwargs: dst_dir.mkdir()
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        lib_refs.resolve()
+
+        mock_clone.assert_has_calls(
+            [
+                mock.call(
+                    lib.get_git_reference().repo_url,
+                    lib.source_code_path,
+                    progress=False,
+                    no_checkout=False,
+                    reference=None,
+                ),
+                mock.call(
+                    lib2.get_git_reference().repo_url,
+                    lib2.source_code_path,
+                    progress=False,
+                    no_checkout=False,
+                    reference=None,
+                ),
+            ],
+            any_order=True,
+        )
+        self.assertTrue(lib.is_resolved())
+        self.assertTrue(lib2.is_resolved())
+
+    @patchfs
+    def test_copies_libraries_sharing_a_repository_from_the_first_clone(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        lib = make_mbed_lib_reference(fs_root, ref_url="https://git#v1")
+        lib2 = make_mbed_lib_reference(fs_root, name="otherlib.lib", ref_url="https://git#v2")
+        mock_clone.side_effect = lambda url, dst_dir, **kwargs: dst_dir.mkdir()
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        with mock.patch("mbed_project._internal.git_utils.checkout", autospec=True):
+            lib_refs.resolve()
+
+        self.assertEqual(
+            mock_clone.call_args_list,
+            [
+                mock.call("https://git", lib.source_code_path, progress=True, no_checkout=True, reference=None),
+                mock.call(
+                    "https://git",
+                    lib2.source_code_path,
+                    progress=True,
+                    no_checkout=True,
+                    reference=lib.source_code_path,
+                ),
+            ],
+        )
+
+    @patchfs
+    def test_clones_libraries_without_pinned_revision_from_the_remote(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        lib = make_mbed_lib_reference(fs_root, ref_url="https://git#v1")
+        lib2 = make_mbed_lib_reference(fs_root, name="otherlib.lib", ref_url="https://git")
+        mock_clone.side_effect = lambda url, dst_dir, **kwargs: dst_dir.mkdir()
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        with mock.patch("mbed_project._internal.git_utils.checkout", autospec=True):
+            lib_refs.resolve()
+
+        self.assertCountEqual(
+            mock_clone.call_args_list,
+            [
+                mock.call("https://git", lib.source_code_path, progress=False, no_checkout=True, reference=None),
+                mock.call("https://git", lib2.source_code_path, progress=False, no_checkout=False, reference=None),
+            ],
+        )
+
     @patchfs
     def test_hydrates_recursive_dependencies(self, mock_clone, fs):
         fs_root = pathlib.Path(fs, "foo")
@@ -35,7 +116,7 @@ class TestLibraryReferences(TestCase):
         )
         # Here we mock the effects of a recursive reference lookup. We create a new lib reference as a side effect of
         # the first call to the mock. Then we create the src dir, thus resolving the lib, on the second call.
-        mock_clone.side_effect = lambda url, dst_dir: (
+        mock_clone.side_effect = lambda url, dst_dir, **kwargs: (
             make_mbed_lib_reference(pathlib.Path(dst_dir), name=lib2.reference_file.name, ref_url="https://valid2"),
             lib2.source_code_path.mkdir(),
         )
@@ -46,10 +127,106 @@ class TestLibraryReferences(TestCase):
         self.assertTrue(lib.is_resolved())
         self.assertTrue(lib2.is_resolved())
 
+    @patchfs
+    def test_does_not_resolve_references_in_ignored_paths(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        mbed_os = make_mbed_lib_reference(fs_root, name="mbed-os.lib", ref_url="https://mbed-os")
+        mock_clone.side_effect = lambda url, dst_dir, **kwargs: make_mbed_lib_reference(
+            dst_dir, name="ignored.lib", ref_url="https://ignored"
+        )
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        lib_refs.resolve()
+
+        mock_clone.assert_called_once_with(
+            "https://mbed-os", mbed_os.source_code_path, progress=True, no_checkout=False, reference=None
+        )
+
+    @patchfs
+    def test_does_not_search_ignored_paths_for_references(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        lib = make_mbed_lib_reference(fs_root, ref_url="https://git")
+        make_mbed_lib_reference(fs_root / "mbed-os", ref_url="https://ignored")
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+
+        self.assertEqual(list(lib_refs.iter_all()), [lib])
+
+    @patchfs
+    def test_does_not_search_ignored_paths_relative_to_working_directory(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        make_mbed_lib_reference(fs_root, ref_url="https://git")
+        make_mbed_lib_reference(fs_root / "mbed-os", ref_url="https://ignored")
+        cwd = os.getcwd()
+        os.chdir(fs_root)
+        try:
+            lib_refs = LibraryReferences(pathlib.Path("."), ignore_paths=[pathlib.Path("mbed-os")])
+
+            self.assertEqual(
+                list(lib_refs.iter_all()), [MbedLibReference(pathlib.Path("mylib.lib"), pathlib.Path("mylib"))]
+            )
+        finally:
+            os.chdir(cwd)
+
+    @patchfs
+    def test_does_not_search_git_or_build_directories_for_references(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        lib = make_mbed_lib_reference(fs_root, ref_url="https://git")
+        make_mbed_lib_reference(fs_root / ".git", ref_url="https://ignored")
+        make_mbed_lib_reference(fs_root / "BUILD", name="compiled.lib")
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+
+        self.assertEqual(list(lib_refs.iter_all()), [lib])
+
+    @patchfs
+    def test_caches_library_references_found_in_tree(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        lib = make_mbed_lib_reference(fs_root, ref_url="https://git")
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        with mock.patch.object(
+            LibraryReferences, "_iter_references", autospec=True, side_effect=LibraryReferences._iter_references
+        ) as mock_iter_references:
+            self.assertEqual(list(lib_refs.iter_all()), [lib])
+            self.assertEqual(list(lib_refs.iter_unresolved()), [lib])
+
+        mock_iter_references.assert_called_once_with(lib_refs, fs_root)
+
+    @patchfs
+    def test_adds_references_found_in_resolved_libraries_to_cache(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        lib = make_mbed_lib_reference(fs_root, ref_url="https://git")
+        lib2 = MbedLibReference(
+            reference_file=(lib.source_code_path / "lib2.lib"), source_code_path=(lib.source_code_path / "lib2")
+        )
+        mock_clone.side_effect = lambda url, dst_dir, **kwargs: make_mbed_lib_reference(
+            dst_dir, name=lib2.reference_file.name, resolved=True, ref_url="https://valid2"
+        )
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        lib_refs.resolve()
+
+        self.assertCountEqual(lib_refs.iter_resolved(), [lib, lib2])
+
+    @patchfs
+    def test_lists_each_parent_directory_once_to_find_resolved_libraries(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        lib = make_mbed_lib_reference(fs_root, name="lib.lib", resolved=True, ref_url="https://git")
+        lib2 = make_mbed_lib_reference(fs_root, name="lib2.lib", ref_url="https://valid2")
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        list(lib_refs.iter_all())
+        with mock.patch("mbed_project._internal.libraries.os.scandir", wraps=os.scandir) as mock_scandir:
+            self.assertEqual(list(lib_refs.iter_resolved()), [lib])
+            self.assertEqual(list(lib_refs.iter_unresolved()), [lib2])
+
+        self.assertEqual(mock_scandir.call_count, 2)
+
     @patchfs
     @mock.patch("mbed_project._internal.git_utils.checkout", autospec=True)
-    @mock.patch("mbed_project._internal.git_utils.init", autospec=True)
-    def test_does_not_perform_checkout_if_no_git_ref_exists(self, mock_init, mock_checkout, mock_clone, fs):
+    @mock.patch("mbed_project._internal.git_utils.get_repo", autospec=True)
+    def test_does_not_perform_checkout_if_no_git_ref_exists(self, mock_get_repo, mock_checkout, mock_clone, fs):
         fs_root = pathlib.Path(fs, "foo")
         make_mbed_lib_reference(fs_root, ref_url="https://git", resolved=True)
 
@@ -60,15 +237,97 @@ class TestLibraryReferences(TestCase):
 
     @patchfs
     @mock.patch("mbed_project._internal.git_utils.checkout", autospec=True)
-    @mock.patch("mbed_project._internal.git_utils.init", autospec=True)
-    def test_performs_checkout_if_git_ref_exists(self, mock_init, mock_checkout, mock_clone, fs):
+    @mock.patch("mbed_project._internal.git_utils.get_repo", autospec=True)
+    def test_performs_checkout_if_git_ref_exists(self, mock_get_repo, mock_checkout, mock_clone, fs):
         fs_root = pathlib.Path(fs, "foo")
         lib = make_mbed_lib_reference(fs_root, ref_url="https://git#lajdhalk234", resolved=True)
 
         lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
         lib_refs.checkout(force=False)
 
-        mock_checkout.assert_called_once_with(mock_init.return_value, lib.get_git_reference().ref, force=False)
+        mock_get_repo.assert_called_once_with(lib.source_code_path)
+        mock_checkout.assert_called_once_with(mock_get_repo.return_value, lib.get_git_reference().ref, force=False)
+
+    @patchfs
+    @mock.patch("mbed_project._internal.git_utils.checkout", autospec=True)
+    @mock.patch("mbed_project._internal.git_utils.get_repo", autospec=True)
+    def test_checks_out_every_resolved_library(self, mock_get_repo, mock_checkout, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        libs = [
+            make_mbed_lib_reference(fs_root, name=f"lib{i}.lib", ref_url=f"https://git/lib{i}#branch{i}", resolved=True)
+            for i in range(3)
+        ]
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        lib_refs.checkout(force=False, parallelism=2)
+
+        self.assertEqual(
+            sorted(c.args[0] for c in mock_get_repo.call_args_list), sorted(lib.source_code_path for lib in libs)
+        )
+        self.assertEqual(sorted(c.args[1] for c in mock_checkout.call_args_list), [f"branch{i}" for i in range(3)])
+
+    @patchfs
+    @mock.patch("mbed_project._internal.git_utils.checkout", autospec=True)
+    @mock.patch("mbed_project._internal.git_utils.get_repo", autospec=True)
+    def test_checks_out_nested_library_at_revision_from_checked_out_parent(
+        self, mock_get_repo, mock_checkout, mock_clone, fs
+    ):
+        fs_root = pathlib.Path(fs, "foo")
+        parent = make_mbed_lib_reference(fs_root, name="P.lib", ref_url="https://git/P#v2", resolved=True)
+        nested = make_mbed_lib_reference(parent.source_code_path, name="nested.lib", ref_url="https://git/N#N1")
+        nested.source_code_path.mkdir()
+
+        def checkout(repo, ref, force):
+            if ref == "v2":
+                nested.reference_file.write_text("https://git/N#N2")
+
+        mock_get_repo.side_effect = lambda path: path
+        mock_checkout.side_effect = checkout
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        lib_refs.checkout(force=False, parallelism=1)
+
+        self.assertEqual(
+            mock_checkout.call_args_list,
+            [
+                mock.call(parent.source_code_path, "v2", force=False),
+                mock.call(nested.source_code_path, "N2", force=False),
+            ],
+        )
+
+    @patchfs
+    @mock.patch("mbed_project._internal.git_utils.checkout", autospec=True)
+    @mock.patch("mbed_project._internal.git_utils.get_repo", autospec=True)
+    def test_checks_out_nested_libraries_added_by_parent_checkout(self, mock_get_repo, mock_checkout, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        parents = [
+            make_mbed_lib_reference(fs_root, name=f"P{i}.lib", ref_url=f"https://git/P{i}#v2", resolved=True)
+            for i in range(2)
+        ]
+        nested = [
+            MbedLibReference(parent.source_code_path / "nested.lib", parent.source_code_path / "nested")
+            for parent in parents
+        ]
+
+        def checkout(repo, ref, force):
+            if ref == "v2":
+                make_mbed_lib_reference(repo, name="nested.lib", ref_url="https://git/N#N2", resolved=True)
+
+        mock_get_repo.side_effect = lambda path: path
+        mock_checkout.side_effect = checkout
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        lib_refs.checkout(force=False)
+
+        self.assertEqual(
+            sorted(c.args[:2] for c in mock_checkout.call_args_list[:2]),
+            [(parent.source_code_path, "v2") for parent in parents],
+        )
+        self.assertEqual(
+            sorted(c.args[:2] for c in mock_checkout.call_args_list[2:]),
+            [(lib.source_code_path, "N2") for lib in nested],
+        )
+        self.assertEqual(list(lib_refs.iter_all()), parents + nested)
 
     @patchfs
     @mock.patch("mbed_project._internal.git_utils.checkout", autospec=True)
@@ -76,7 +335,7 @@ class TestLibraryReferences(TestCase):
     def test_resolve_does_not_perform_checkout_if_no_git_ref_exists(self, mock_init, mock_checkout, mock_clone, fs):
         fs_root = pathlib.Path(fs, "foo")
         make_mbed_lib_reference(fs_root, ref_url="https://git")
-        mock_clone.side_effect = lambda url, dst_dir: dst_dir.mkdir()
+        mock_clone.side_effect = lambda url, dst_dir, **kwargs: dst_dir.mkdir()
 
         lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
         lib_refs.resolve()
@@ -89,9 +348,61 @@ class TestLibraryReferences(TestCase):
     def test_resolve_performs_checkout_if_git_ref_exists(self, mock_init, mock_checkout, mock_clone, fs):
         fs_root = pathlib.Path(fs, "foo")
         lib = make_mbed_lib_reference(fs_root, ref_url="https://git#lajdhalk234")
-        mock_clone.side_effect = lambda url, dst_dir: dst_dir.mkdir()
+        mock_clone.side_effect = lambda url, dst_dir, **kwargs: dst_dir.mkdir()
 
         lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
         lib_refs.resolve()
 
         mock_checkout.assert_called_once_with(None, lib.get_git_reference().ref)
+        mock_clone.assert_called_once_with(
+            lib.get_git_reference().repo_url, lib.source_code_path, progress=True, no_checkout=True, reference=None
+        )
+
+    @patchfs
+    @mock.patch("mbed_project._internal.git_utils.checkout", autospec=True)
+    @mock.patch("mbed_project._internal.git_utils.is_detached_at", autospec=True, return_value=True)
+    @mock.patch("mbed_project._internal.git_utils.get_repo", autospec=True)
+    def test_skips_checkout_if_already_at_pinned_commit(
+        self, mock_get_repo, mock_is_detached_at, mock_checkout, mock_clone, fs
+    ):
+        fs_root = pathlib.Path(fs, "foo")
+        sha = "a" * 40
+        make_mbed_lib_reference(fs_root, ref_url=f"https://git#{sha}", resolved=True)
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        lib_refs.checkout(force=False)
+
+        mock_is_detached_at.assert_called_once_with(mock_get_repo.return_value, sha)
+        mock_checkout.assert_not_called()
+
+    @patchfs
+    @mock.patch("mbed_project._internal.git_utils.checkout", autospec=True)
+    @mock.patch("mbed_project._internal.git_utils.is_detached_at", autospec=True, return_value=True)
+    @mock.patch("mbed_project._internal.git_utils.get_repo", autospec=True)
+    def test_forced_checkout_checks_out_pinned_commit_again(
+        self, mock_get_repo, mock_is_detached_at, mock_checkout, mock_clone, fs
+    ):
+        fs_root = pathlib.Path(fs, "foo")
+        sha = "a" * 40
+        make_mbed_lib_reference(fs_root, ref_url=f"https://git#{sha}", resolved=True)
+
+        lib_refs = LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"])
+        lib_refs.checkout(force=True)
+
+        mock_checkout.assert_called_once_with(mock_get_repo.return_value, sha, force=True)
+
+
+class TestResolveLibrariesFromRepositories(TestCase):
+    @patchfs
+    def test_library_without_pinned_revision_does_not_inherit_revision_of_copied_clone(self, fs):
+        upstream = git.Repo.init(pathlib.Path(fs, "upstream"))
+        author = git.Actor("Mbed", "mbed@example.com")
+        pinned_commit = upstream.index.commit("First", author=author, committer=author)
+        default_commit = upstream.index.commit("Second", author=author, committer=author)
+        fs_root = pathlib.Path(fs, "foo")
+        make_mbed_lib_reference(fs_root, ref_url=f"{upstream.working_dir}#{pinned_commit.hexsha}")
+        lib = make_mbed_lib_reference(fs_root / "sub", ref_url=upstream.working_dir)
+
+        LibraryReferences(fs_root, ignore_paths=[fs_root / "mbed-os"]).resolve()
+
+        self.assertEqual(git.Repo(lib.source_code_path).head.commit, default_commit)
@@ -8,9 +8,15 @@ from unittest import mock, TestCase
 
 from mbed_project import MbedProgram
 from mbed_project.exceptions import ExistingProgram, ProgramNotFound, MbedOSNotFound, VersionControlError
-from mbed_project.mbed_program import _find_program_root, parse_url
+from mbed_project.mbed_program import _find_program_root, _tree_contains_program, parse_url
 from mbed_project._internal.project_data import MbedProgramFiles, MbedOS
-from tests.factories import make_mbed_program_files, make_mbed_os_files, make_mbed_lib_reference, patchfs
+from tests.factories import make_mbed_program, make_mbed_program_files, make_mbed_lib_reference, patchfs
+
+
+def make_expected_program_files(root):
+    return MbedProgramFiles(
+        app_config_file=root / "mbed_app.json", mbed_file=root / ".mbed", mbed_os_ref=root / "mbed-os.lib"
+    )
 
 
 class TestInitialiseProgram(TestCase):
@@ -32,10 +38,21 @@ class TestInitialiseProgram(TestCase):
 
         program = MbedProgram.from_new(program_root)
 
-        self.assertEqual(program.files, MbedProgramFiles.from_existing(program_root))
+        self.assertEqual(program.files, make_expected_program_files(program_root))
+        self.assertTrue(program.files.mbed_file.is_file())
+        self.assertTrue(program.files.mbed_os_ref.is_file())
         self.assertEqual(program.repo, mock_init.return_value)
         mock_init.assert_called_once_with(program_root)
 
+    @patchfs
+    @mock.patch("mbed_project._internal.git_utils.init", autospec=True)
+    def test_from_new_local_dir_program_is_found_after_creation(self, mock_init, fs):
+        program_root = pathlib.Path(fs, "programfoo")
+
+        MbedProgram.from_new(program_root)
+
+        self.assertEqual(_find_program_root(program_root), program_root.resolve())
+
     @patchfs
     def test_from_url_raises_if_dest_dir_contains_program(self, fs):
         fs_root = pathlib.Path(fs, "foo")
@@ -51,7 +68,7 @@ class TestInitialiseProgram(TestCase):
         fs_root = pathlib.Path(fs, "foo")
         fs_root.mkdir()
         url = "https://validrepo.com"
-        mock_repo.side_effect = lambda url, dst_dir: dst_dir.mkdir()
+        mock_repo.side_effect = lambda url, dst_dir, **kwargs: dst_dir.mkdir()
 
         with self.assertRaises(ProgramNotFound):
             MbedProgram.from_url(url, fs_root / "corrupt-prog")
@@ -61,7 +78,7 @@ class TestInitialiseProgram(TestCase):
     def test_from_url_raises_if_check_mbed_os_is_true_and_mbed_os_dir_nonexistent(self, mock_clone, fs):
         fs_root = pathlib.Path(fs, "foo")
         url = "https://validrepo.com"
-        mock_clone.side_effect = lambda *args: make_mbed_program_files(fs_root)
+        mock_clone.side_effect = lambda *args, **kwargs: make_mbed_program_files(fs_root)
 
         with self.assertRaises(MbedOSNotFound):
             MbedProgram.from_url(url, fs_root, check_mbed_os=True)
@@ -71,11 +88,25 @@ class TestInitialiseProgram(TestCase):
     def test_from_url_returns_valid_program(self, mock_clone, fs):
         fs_root = pathlib.Path(fs, "foo")
         url = "https://valid"
-        mock_clone.side_effect = lambda *args: make_mbed_program_files(fs_root)
+        mock_clone.side_effect = lambda *args, **kwargs: make_mbed_program_files(fs_root)
         program = MbedProgram.from_url(url, fs_root, False)
 
-        self.assertEqual(program.files, MbedProgramFiles.from_existing(fs_root))
-        mock_clone.assert_called_once_with(url, fs_root)
+        self.assertEqual(program.files, make_expected_program_files(fs_root))
+        mock_clone.assert_called_once_with(url, fs_root, depth=1, branch=None)
+
+    @patchfs
+    @mock.patch("mbed_project.mbed_program.git_utils.clone", autospec=True)
+    def test_from_url_finds_mbed_os_in_cloned_program(self, mock_clone, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        url = "https://valid"
+
+        def clone_program(*args, **kwargs):
+            make_mbed_program(fs_root)
+
+        mock_clone.side_effect = clone_program
+        program = MbedProgram.from_url(url, fs_root, check_mbed_os=True)
+
+        self.assertEqual(program.mbed_os.root, fs_root / "mbed-os")
 
     @patchfs
     def test_from_existing_raises_if_path_is_not_a_program(self, fs):
@@ -97,16 +128,30 @@ class TestInitialiseProgram(TestCase):
             MbedProgram.from_existing(program_root)
 
     @patchfs
-    def test_from_existing_raises_if_no_repo_found(self, fs):
+    def test_repo_raises_if_no_repo_found(self, fs):
         fs_root = pathlib.Path(fs, "foo")
-        make_mbed_program_files(fs_root)
+        make_mbed_program(fs_root)
+        program = MbedProgram.from_existing(fs_root)
 
         with self.assertRaises(VersionControlError):
-            MbedProgram.from_existing(fs_root)
+            program.repo
 
     @patchfs
-    @mock.patch("mbed_project._internal.git_utils.git.Repo", autospec=True)
-    def test_from_existing_raises_if_no_mbed_os_dir_found_and_check_mbed_os_is_true(self, mock_repo, fs):
+    @mock.patch("mbed_project._internal.git_utils.get_repo", autospec=True)
+    def test_from_existing_does_not_open_repo_until_used(self, mock_get_repo, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        make_mbed_program(fs_root)
+
+        program = MbedProgram.from_existing(fs_root)
+        program.list_known_library_dependencies()
+        mock_get_repo.assert_not_called()
+
+        self.assertEqual(program.repo, mock_get_repo.return_value)
+        self.assertEqual(program.repo, mock_get_repo.return_value)
+        mock_get_repo.assert_called_once_with(program.files.mbed_file.parent)
+
+    @patchfs
+    def test_from_existing_raises_if_no_mbed_os_dir_found_and_check_mbed_os_is_true(self, fs):
         fs_root = pathlib.Path(fs, "foo")
         make_mbed_program_files(fs_root)
 
@@ -114,11 +159,10 @@ class TestInitialiseProgram(TestCase):
             MbedProgram.from_existing(fs_root, check_mbed_os=True)
 
     @patchfs
-    @mock.patch("mbed_project._internal.git_utils.git.Repo", autospec=True)
-    def test_from_existing_returns_valid_program(self, mock_repo, fs):
+    @mock.patch("mbed_project._internal.git_utils.get_repo", autospec=True)
+    def test_from_existing_returns_valid_program(self, mock_get_repo, fs):
         fs_root = pathlib.Path(fs, "foo")
-        make_mbed_program_files(fs_root)
-        make_mbed_os_files(fs_root / "mbed-os")
+        make_mbed_program(fs_root)
 
         program = MbedProgram.from_existing(fs_root)
 
@@ -126,6 +170,20 @@ class TestInitialiseProgram(TestCase):
         self.assertTrue(program.mbed_os.root.exists())
         self.assertIsNotNone(program.repo)
 
+    @patchfs
+    def test_from_existing_finds_mbed_os_when_used_if_check_mbed_os_is_false(self, fs):
+        fs_root = pathlib.Path(fs, "foo")
+        make_mbed_program_files(fs_root)
+        (fs_root / "mbed-os").mkdir()
+        make_mbed_lib_reference(fs_root / "mbed-os", ref_url="https://ignored")
+
+        program = MbedProgram.from_existing(fs_root, check_mbed_os=False)
+
+        libs = program.list_known_library_dependencies()
+        self.assertEqual([lib.reference_file for lib in libs], [fs_root / "mbed-os.lib"])
+        with self.assertRaises(MbedOSNotFound):
+            program.mbed_os
+
 
 class TestLibReferenceHandling(TestCase):
     @mock.patch("mbed_project.mbed_program.LibraryReferences", autospec=True)
@@ -172,6 +230,18 @@ class TestLibReferenceHandling(TestCase):
         )
         self.assertTrue(program.has_unresolved_libraries())
 
+    @patchfs
+    def test_checks_for_unresolved_libraries_when_all_are_resolved(self, fs):
+        root = pathlib.Path(fs, "root")
+        make_mbed_lib_reference(root, resolved=True, ref_url="https://blah")
+        mbed_os_root = root / "mbed-os"
+        mbed_os_root.mkdir()
+
+        program = MbedProgram(
+            None, MbedProgramFiles(None, pathlib.Path(root / ".mbed"), None), MbedOS(mbed_os_root, None)
+        )
+        self.assertFalse(program.has_unresolved_libraries())
+
 
 class TestParseURL(TestCase):
     def test_creates_url_and_dst_dir_from_name(self):
@@ -188,6 +258,12 @@ class TestParseURL(TestCase):
         self.assertEqual(data["url"], url)
         self.assertEqual(data["dst_path"], "mbed-os-example-numskull")
 
+    def test_creates_url_and_dst_dir_from_path_without_host(self):
+        data = parse_url("mbed-os-examples/mbed-os-example-blinky")
+
+        self.assertEqual(data["url"], "https://github.com/armmbed/mbed-os-examples/mbed-os-example-blinky")
+        self.assertEqual(data["dst_path"], "mbed-os-example-blinky")
+
 
 class TestFindProgramRoot(TestCase):
     @patchfs
@@ -206,6 +282,20 @@ class TestFindProgramRoot(TestCase):
 
         self.assertEqual(_find_program_root(program_root), program_root.resolve())
 
+    @patchfs
+    def test_sees_program_files_created_or_removed_after_a_search(self, fs):
+        program_root = pathlib.Path(fs, "foo")
+        program_root.mkdir()
+        with self.assertRaises(ProgramNotFound):
+            _find_program_root(program_root)
+
+        (program_root / ".mbed").touch()
+        self.assertEqual(_find_program_root(program_root), program_root.resolve())
+
+        (program_root / ".mbed").unlink()
+        with self.assertRaises(ProgramNotFound):
+            _find_program_root(program_root)
+
     @patchfs
     def test_raises_if_no_program_found(self, fs):
         program_root = pathlib.Path(fs, "foo")
@@ -213,3 +303,36 @@ class TestFindProgramRoot(TestCase):
 
         with self.assertRaises(ProgramNotFound):
             _find_program_root(program_root)
+
+    @patchfs
+    def test_ignores_mbed_directory(self, fs):
+        program_root = pathlib.Path(fs, "foo")
+        (program_root / ".mbed").mkdir(parents=True)
+
+        with self.assertRaises(ProgramNotFound):
+            _find_program_root(program_root)
+
+
+class TestTreeContainsProgram(TestCase):
+    @patchfs
+    def test_returns_program_root_if_found(self, fs):
+        program_root = pathlib.Path(fs, "foo")
+        make_mbed_program_files(program_root)
+
+        self.assertEqual(_tree_contains_program(program_root / "subdir"), program_root.resolve())
+
+    @patchfs
+    def test_finds_program_above_empty_directory(self, fs):
+        program_root = pathlib.Path(fs, "foo")
+        make_mbed_program_files(program_root)
+        empty_dir = program_root / "empty"
+        empty_dir.mkdir()
+
+        self.assertEqual(_tree_contains_program(empty_dir), program_root.resolve())
+
+    @patchfs
+    def test_returns_none_if_no_program_found(self, fs):
+        path = pathlib.Path(fs, "foo")
+        path.mkdir()
+
+        self.assertIsNone(_tree_contains_program(path))
@@ -4,7 +4,7 @@
 #
 from unittest import TestCase, mock
 
-from mbed_project._internal.progress import ProgressReporter, ProgressBar
+from mbed_project._internal.progress import MAX_REDRAWS, REDRAW_INTERVAL, ProgressReporter, ProgressBar
 
 
 class TestProgressBar(TestCase):
@@ -15,6 +15,25 @@ class TestProgressBar(TestCase):
 
         mock_bar_update.assert_called_once_with(1)
 
+    @mock.patch("mbed_project._internal.progress.ProgressBar.update")
+    def test_does_not_update_progress_bar_for_changes_smaller_than_miniters(self, mock_bar_update):
+        bar = ProgressBar(total=100, miniters=10)
+        bar.update_progress(5)
+
+        mock_bar_update.assert_not_called()
+
+        bar.update_progress(12)
+
+        mock_bar_update.assert_called_once_with(12)
+
+    @mock.patch("mbed_project._internal.progress.ProgressBar.update")
+    def test_updates_progress_bar_when_finished(self, mock_bar_update):
+        bar = ProgressBar(total=100, miniters=10)
+        bar.n = 95
+        bar.update_progress(100)
+
+        mock_bar_update.assert_called_once_with(5)
+
     def test_sets_total_attribute_to_value_of_total_size(self):
         bar = ProgressBar()
 
@@ -34,6 +53,30 @@ class TestProgressReporter(TestCase):
 
         mock_progress_bar.assert_called_once()
 
+    def test_sets_progress_bar_description_to_operation_name(self, mock_progress_bar):
+        reporter = ProgressReporter(name="https://repo")
+        reporter._cur_line = "Receiving objects:   3% (15/500)"
+        reporter.update(reporter.BEGIN | reporter.RECEIVING, 15, 500)
+
+        mock_progress_bar.assert_called_once_with(
+            total=500,
+            desc="https://repo Receiving objects",
+            file=mock.ANY,
+            leave=False,
+            mininterval=mock.ANY,
+            miniters=mock.ANY,
+        )
+        mock_progress_bar.return_value.update_progress.assert_called_once_with(block_num=15)
+
+    def test_limits_progress_bar_redraws(self, mock_progress_bar):
+        reporter = ProgressReporter()
+        reporter._cur_line = "Counting objects: 0% (0/100000)"
+        reporter.update(reporter.BEGIN | reporter.COUNTING, 0, 100000)
+
+        _, kwargs = mock_progress_bar.call_args
+        self.assertEqual(kwargs["mininterval"], REDRAW_INTERVAL)
+        self.assertEqual(kwargs["miniters"], 100000 // MAX_REDRAWS)
+
     def test_closes_progress_bar_on_end_opcode(self, mock_progress_bar):
         reporter = ProgressReporter()
         reporter.bar = mock_progress_bar()
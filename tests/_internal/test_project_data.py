@@ -20,6 +20,17 @@ class TestMbedProgramFiles(TestCase):
         with self.assertRaises(ValueError):
             MbedProgramFiles.from_new(root)
 
+    @patchfs
+    def test_from_new_raises_and_leaves_no_mbed_file_if_mbed_os_lib_exists(self, fs):
+        root = pathlib.Path(fs, "foo")
+        root.mkdir()
+        (root / "mbed-os.lib").touch()
+
+        with self.assertRaises(ValueError):
+            MbedProgramFiles.from_new(root)
+
+        self.assertFalse((root / ".mbed").exists())
+
     @patchfs
     def test_from_new_returns_valid_program(self, fs):
         root = pathlib.Path(fs, "foo")
@@ -37,6 +48,13 @@ class TestMbedProgramFiles(TestCase):
         with self.assertRaises(ValueError):
             MbedProgramFiles.from_existing(root)
 
+    @patchfs
+    def test_from_existing_raises_if_directory_doesnt_exist(self, fs):
+        root = pathlib.Path(fs, "foo")
+
+        with self.assertRaises(ValueError):
+            MbedProgramFiles.from_existing(root)
+
     @patchfs
     def test_from_existing_finds_existing_program_data(self, fs):
         root = pathlib.Path(fs, "foo")
@@ -46,6 +64,35 @@ class TestMbedProgramFiles(TestCase):
 
         self.assertTrue(program.app_config_file.exists())
 
+    @patchfs
+    def test_from_existing_sets_app_config_to_none_if_it_doesnt_exist(self, fs):
+        root = pathlib.Path(fs, "foo")
+        make_mbed_program_files(root)
+        (root / "mbed_app.json").unlink()
+
+        program = MbedProgramFiles.from_existing(root)
+
+        self.assertIsNone(program.app_config_file)
+
+    @patchfs
+    def test_from_existing_creates_missing_mbed_file(self, fs):
+        root = pathlib.Path(fs, "foo")
+        make_mbed_program_files(root)
+        (root / ".mbed").unlink()
+
+        program = MbedProgramFiles.from_existing(root)
+
+        self.assertTrue(program.mbed_file.exists())
+
+    @patchfs
+    def test_from_existing_uses_given_file_names(self, fs):
+        root = pathlib.Path(fs, "foo")
+        make_mbed_program_files(root)
+
+        program = MbedProgramFiles.from_existing(root, file_names={".mbed", "mbed-os.lib"})
+
+        self.assertIsNone(program.app_config_file)
+
 
 class TestMbedLibReference(TestCase):
     @patchfs
@@ -75,6 +122,18 @@ class TestMbedLibReference(TestCase):
         self.assertEqual(reference.repo_url, url)
         self.assertEqual(reference.ref, ref)
 
+    @patchfs
+    def test_get_git_reference_reads_long_lib_files(self, fs):
+        root = pathlib.Path(fs, "foo")
+        url = "https://github.com/" + "a" * 300
+        ref = "latest"
+        lib = make_mbed_lib_reference(root, ref_url=f"{url}#{ref}\n")
+
+        reference = lib.get_git_reference()
+
+        self.assertEqual(reference.repo_url, url)
+        self.assertEqual(reference.ref, ref)
+
 
 class TestMbedOS(TestCase):
     @patchfs
@@ -93,3 +152,30 @@ class TestMbedOS(TestCase):
 
         with self.assertRaises(ValueError):
             MbedOS.from_existing(root_path)
+
+    @patchfs
+    def test_raises_if_root_path_missing(self, fs):
+        root_path = pathlib.Path(fs, "my-version-of-mbed-os")
+
+        with self.assertRaises(ValueError):
+            MbedOS.from_existing(root_path)
+
+    @patchfs
+    def test_does_not_raise_for_missing_root_path_if_not_checked(self, fs):
+        root_path = pathlib.Path(fs, "my-version-of-mbed-os")
+
+        mbed_os = MbedOS.from_existing(root_path, check_root_path_exists=False)
+
+        self.assertEqual(mbed_os.targets_json_file, root_path / "targets" / "targets.json")
+
+    @patchfs
+    def test_uses_given_root_path_existence(self, fs):
+        root_path = pathlib.Path(fs, "my-version-of-mbed-os")
+        root_path.mkdir()
+
+        with self.assertRaises(ValueError):
+            MbedOS.from_existing(root_path, root_exists=False)
+
+        mbed_os = MbedOS.from_existing(root_path, check_root_path_exists=False, root_exists=False)
+
+        self.assertEqual(mbed_os.root, root_path)
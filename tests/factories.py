@@ -17,8 +17,7 @@ def patchfs(func):
 
 
 def make_mbed_program_files(root, config_file_name="mbed_app.json"):
-    if not root.exists():
-        root.mkdir()
+    root.mkdir(exist_ok=True)
 
     (root / ".mbed").touch()
     (root / "mbed-os.lib").touch()
@@ -28,24 +27,24 @@ def make_mbed_program_files(root, config_file_name="mbed_app.json"):
 def make_mbed_lib_reference(root, name="mylib.lib", resolved=False, ref_url=None):
     ref_file = root / name
     source_dir = ref_file.with_suffix("")
-    if not root.exists():
-        root.mkdir()
+    root.mkdir(exist_ok=True)
 
-    ref_file.touch()
+    ref_file.write_text(ref_url or "")
 
     if resolved:
         source_dir.mkdir()
 
-    if ref_url is not None:
-        ref_file.write_text(ref_url)
-
     return MbedLibReference(reference_file=ref_file, source_code_path=source_dir)
 
 
 def make_mbed_os_files(root):
-    if not root.exists():
-        root.mkdir()
+    root.mkdir(exist_ok=True)
 
     targets_dir = root / "targets"
     targets_dir.mkdir()
     (targets_dir / "targets.json").touch()
+
+
+def make_mbed_program(root):
+    make_mbed_program_files(root)
+    make_mbed_os_files(root / "mbed-os")
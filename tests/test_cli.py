@@ -30,7 +30,21 @@ class TestInitCommand(TestCase):
 class TestCloneCommand(TestCase):
     def test_calls_clone_function_with_correct_args(self, mocked_clone_project):
         CliRunner().invoke(clone, ["url", "dst"])
-        mocked_clone_project.assert_called_once_with("url", pathlib.Path("dst"), True)
+        mocked_clone_project.assert_called_once_with(
+            "url", pathlib.Path("dst"), True, depth=1, branch=None, parallelism=8
+        )
+
+    def test_clones_full_history_of_branch_if_requested(self, mocked_clone_project):
+        CliRunner().invoke(clone, ["url", "dst", "--full-history", "--branch", "feature"])
+        mocked_clone_project.assert_called_once_with(
+            "url", pathlib.Path("dst"), True, depth=None, branch="feature", parallelism=8
+        )
+
+    def test_clones_dependencies_with_given_number_of_jobs(self, mocked_clone_project):
+        CliRunner().invoke(clone, ["url", "dst", "--jobs", "2"])
+        mocked_clone_project.assert_called_once_with(
+            "url", pathlib.Path("dst"), True, depth=1, branch=None, parallelism=2
+        )
 
 
 @mock.patch("mbed_project.mbed_tools.cli.get_known_libs", autospec=True)
@@ -39,9 +53,19 @@ class TestLibsCommand(TestCase):
         CliRunner().invoke(libs)
         mocked_get_libs.assert_called_once()
 
+    def test_reads_each_library_reference_once(self, mocked_get_libs):
+        lib = mock.Mock(reference_file=pathlib.Path("mylib.lib"))
+        lib.get_git_reference.return_value = mock.Mock(repo_url="https://git", ref="1234")
+        mocked_get_libs.return_value = {"known_libs": [lib], "unresolved": False}
+
+        result = CliRunner().invoke(libs)
+
+        lib.get_git_reference.assert_called_once_with()
+        self.assertIn("https://git", result.output)
+
 
 @mock.patch("mbed_project.mbed_tools.cli.checkout_project_revision", autospec=True)
 class TestCheckoutCommand(TestCase):
     def test_calls_checkout_function_with_correct_args(self, mocked_checkout_project_revision):
-        CliRunner().invoke(checkout, ["path", "--force"])
-        mocked_checkout_project_revision.assert_called_once_with(pathlib.Path("path"), True)
+        CliRunner().invoke(checkout, ["path", "--force", "-j", "3"])
+        mocked_checkout_project_revision.assert_called_once_with(pathlib.Path("path"), True, 3)
@@ -32,15 +32,27 @@ class TestCloneProject(TestCase):
         url = "https://git.com/gitorg/repo"
         clone_project(url, recursive=False)
 
-        mock_program.from_url.assert_called_once_with(url, pathlib.Path(url.rsplit("/", maxsplit=1)[-1]), False)
+        mock_program.from_url.assert_called_once_with(
+            url, pathlib.Path("repo"), check_mbed_os=False, depth=1, branch=None
+        )
 
     def test_resolves_libs_when_recursive_is_true(self, mock_program):
         url = "https://git.com/gitorg/repo"
         clone_project(url, recursive=True)
 
-        mock_program.from_url.assert_called_once_with(url, pathlib.Path(url.rsplit("/", maxsplit=1)[-1]), False)
+        mock_program.from_url.assert_called_once_with(
+            url, pathlib.Path("repo"), check_mbed_os=False, depth=1, branch=None
+        )
         mock_program.from_url.return_value.resolve_libraries.assert_called_once()
 
+    def test_clones_branch_with_given_depth(self, mock_program):
+        url = "https://git.com/gitorg/repo"
+        clone_project(url, recursive=False, depth=None, branch="feature")
+
+        mock_program.from_url.assert_called_once_with(
+            url, pathlib.Path("repo"), check_mbed_os=False, depth=None, branch="feature"
+        )
+
 
 @mock.patch("mbed_project.mbed_project.MbedProgram", autospec=True)
 class TestCheckoutProject(TestCase):
@@ -49,13 +61,13 @@ class TestCheckoutProject(TestCase):
         checkout_project_revision(path, force=False)
 
         mock_program.from_existing.assert_called_once_with(path, False)
-        mock_program.from_existing.return_value.checkout_libraries.assert_called_once_with(force=False)
+        mock_program.from_existing.return_value.checkout_libraries.assert_called_once_with(force=False, parallelism=8)
 
     def test_resolves_libs_if_unresolved_detected(self, mock_program):
         path = pathlib.Path("somewhere")
-        checkout_project_revision(path)
+        checkout_project_revision(path, parallelism=2)
 
-        mock_program.from_existing.return_value.resolve_libraries.assert_called_once()
+        mock_program.from_existing.return_value.resolve_libraries.assert_called_once_with(2)
 
 
 @mock.patch("mbed_project.mbed_project.MbedProgram", autospec=True)